@@ -0,0 +1,115 @@
+"""This module loads and caches the game's images, sounds, fonts and text."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import pygame
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+class Assets:
+    """Shared asset cache.
+
+    Images are loaded from img/<name>.png once and shared by every sprite
+    using them. A missing or unreadable file falls back to a solid colour
+    surface of the requested size. Surfaces are converted to the display
+    format as soon as a display exists. Sounds are loaded from sfx/<name>.wav
+    on first use. preload() reads image files on a background thread, so the
+    display and the menu can be set up while they load.
+    """
+    def __init__(self, root: str = ASSET_DIR):
+        self.root = root
+        self._images: Dict[tuple, pygame.Surface] = {}
+        self._converted = set()
+        self._pending = {}
+        self._sounds = {}
+        self._fonts = {}
+        self._text = {}
+        self._executor = None
+
+    def _read(self, name: str) -> Optional[pygame.Surface]:
+        path = os.path.join(self.root, 'img', name + '.png')
+        try:
+            return pygame.image.load(path)
+        except (pygame.error, FileNotFoundError):
+            return None
+
+    def _convert(self, key: tuple, surface: pygame.Surface) -> pygame.Surface:
+        if key not in self._converted and pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha() if surface.get_alpha() else surface.convert()
+            self._images[key] = surface
+            self._converted.add(key)
+        return surface
+
+    def solid(self, size: Tuple[int, int], color) -> pygame.Surface:
+        """Shared surface filled with one colour."""
+        key = ('solid', tuple(size), tuple(color))
+        surface = self._images.get(key)
+        if surface is None:
+            surface = self._images[key] = pygame.Surface(size)
+            surface.fill(color)
+        return self._convert(key, surface)
+
+    def image(self, name: str, size: Tuple[int, int], color) -> pygame.Surface:
+        """Shared image of the given size, a solid colour surface if it has no file."""
+        key = (name, tuple(size))
+        surface = self._images.get(key)
+        if surface is None:
+            future = self._pending.pop(name, None)
+            loaded = future.result() if future else self._read(name)
+            if loaded is None:
+                surface = self._images[key] = self.solid(size, color)
+                return surface
+            if loaded.get_size() != tuple(size):
+                loaded = pygame.transform.scale(loaded, size)
+            surface = self._images[key] = loaded
+        return self._convert(key, surface)
+
+    def preload(self, names: Iterable[str]) -> None:
+        """Start reading image files in the background."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        for name in names:
+            if name not in self._pending:
+                self._pending[name] = self._executor.submit(self._read, name)
+
+    def sound(self, name: str) -> Optional['pygame.mixer.Sound']:
+        """Sound loaded on first use, None without audio or a readable file.
+
+        The mixer is initialized with the first sound, so runs without sound
+        never pay for opening the audio device.
+        """
+        if name not in self._sounds:
+            if not pygame.mixer.get_init():
+                try:
+                    pygame.mixer.init()
+                except pygame.error:
+                    return None
+            try:
+                self._sounds[name] = pygame.mixer.Sound(
+                    os.path.join(self.root, 'sfx', name + '.wav'))
+            except (pygame.error, FileNotFoundError):
+                self._sounds[name] = None
+        return self._sounds[name]
+
+    def font(self, size: int) -> pygame.font.Font:
+        """Default font of the given size, initializing the font module on first use."""
+        if size not in self._fonts:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self._fonts[size] = pygame.font.Font(None, size)
+        return self._fonts[size]
+
+    def text(self, string: str, size: int = 128, color=(255, 255, 255)) -> pygame.Surface:
+        """Rendered text, cached per string, size and colour."""
+        key = (string, size, tuple(color))
+        if key not in self._text:
+            self._text[key] = self.font(size).render(string, True, color)
+        return self._text[key]
+
+    def shutdown(self) -> None:
+        """Stop the background loader."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._pending.clear()
@@ -0,0 +1,120 @@
+"""This module runs seeded headless episodes in parallel and stores their results."""
+import argparse
+import os
+import struct
+from multiprocessing import Pool
+from typing import Iterator, List, NamedTuple
+
+import main
+from simulation import RandomInput, Simulation
+
+MAGIC = b'GBR1'
+RECORD = struct.Struct('<QBfhHB')
+OUTCOMES = ['won', 'dead', 'timeout', 'quit']
+ACHIEVEMENTS = ['Codebreaker', 'One Hit', 'Pacifist']
+
+class EpisodeResult(NamedTuple):
+    """Outcome of one seeded episode."""
+    seed: int
+    outcome: str
+    time: float
+    hp: int
+    deaths: int
+    achievements: List[str]
+
+    def pack(self) -> bytes:
+        """Pack the result into a fixed-size binary record."""
+        flags = sum(1 << ACHIEVEMENTS.index(name) for name in self.achievements)
+        return RECORD.pack(self.seed, OUTCOMES.index(self.outcome), self.time,
+                           self.hp, self.deaths, flags)
+
+    @classmethod
+    def unpack(cls, record: bytes) -> 'EpisodeResult':
+        """Unpack a binary record written by pack."""
+        seed, outcome, time, hp, deaths, flags = RECORD.unpack(record)
+        return cls(seed, OUTCOMES[outcome], time, hp, deaths,
+                   [name for i, name in enumerate(ACHIEVEMENTS) if flags & (1 << i)])
+
+def run_episode(seed: int, max_deaths: int = 3, max_frames: int = 216000) -> EpisodeResult:
+    """Play one seeded episode, restarting from the first level after each death.
+
+    The episode ends at the max_deaths-th death. As in the interactive game,
+    the run time restarts with every new attempt while attacking in any
+    attempt rules out the Pacifist achievement.
+    """
+    inputs = RandomInput(seed)
+    deaths = 0
+    frames = 0
+    attacked = False
+    awarded = []
+    sim = Simulation(inputs, seed=seed)
+
+    while True:
+        status = sim.run(max_frames - frames)
+        frames += sim.frames
+        attacked = attacked or sim.attacked
+        if status == 'dead':
+            deaths += 1
+            if 'Pacifist' not in awarded:
+                awarded += main.game_over_achievements(sim.boss, attacked)
+            if deaths < max_deaths and frames < max_frames:
+                sim = Simulation(inputs, rng=sim.rng)
+                continue
+        elif status == 'won':
+            awarded = main.score_achievements(sim.elapsed, sim.player.hp) + awarded
+        elif status == 'running':
+            status = 'timeout'
+        return EpisodeResult(seed, status, sim.elapsed, max(sim.player.hp, 0), deaths, awarded)
+
+def _run_episode(args) -> EpisodeResult:
+    return run_episode(*args)
+
+def run_batch(seeds, path: str, workers: int = None, max_deaths: int = 3,
+              max_frames: int = 216000, chunksize: int = 16) -> int:
+    """Run the seeds over a process pool, streaming results to path as they finish."""
+    count = 0
+    with open(path, 'wb') as file, Pool(workers) as pool:
+        file.write(MAGIC)
+        jobs = ((seed, max_deaths, max_frames) for seed in seeds)
+        for result in pool.imap_unordered(_run_episode, jobs, chunksize):
+            file.write(result.pack())
+            count += 1
+    return count
+
+def read_results(path: str) -> Iterator[EpisodeResult]:
+    """Read the results written by run_batch."""
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + ' is not a batch result file')
+        while record := file.read(RECORD.size):
+            yield EpisodeResult.unpack(record)
+
+def summary(results) -> str:
+    """Summarize results as a short human readable report."""
+    results = list(results)
+    lines = ['Episodes: ' + str(len(results))]
+    for outcome in OUTCOMES:
+        lines.append(outcome + ': ' + str(sum(r.outcome == outcome for r in results)))
+    for name in ACHIEVEMENTS:
+        lines.append(name + ': ' + str(sum(name in r.achievements for r in results)))
+    return '\n'.join(lines)
+
+def main_cli() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--start', type=int, default=0, help='first seed')
+    parser.add_argument('--count', type=int, default=1000, help='number of seeds')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--max-deaths', type=int, default=3)
+    parser.add_argument('--max-frames', type=int, default=216000)
+    parser.add_argument('--out', default='batch_results.bin')
+    args = parser.parse_args()
+    if args.start < 0 or args.count < 0 or args.start + args.count > 1 << 64:
+        parser.error('seeds must lie in 0 .. 2**64 - 1')
+
+    run_batch(range(args.start, args.start + args.count), args.out, args.workers,
+              args.max_deaths, args.max_frames)
+    print(summary(read_results(args.out)))
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,185 @@
+"""This module benchmarks map generation, pathfinding, collisions and rendering."""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+import main
+from simulation import RandomInput, Simulation
+
+MAP_SIZES = (17, 33, 65, 129)
+ENTITY_COUNTS = (1, 16, 256)
+ROSTER_SIZES = (16, 256, 1024)
+
+def measure(function: Callable[[], object], repeat: int, number: int = 1) -> Dict[str, float]:
+    """Time function and return per-call statistics in milliseconds."""
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) * 1000 / number)
+    return {'median_ms': statistics.median(times), 'min_ms': min(times),
+            'runs': repeat * number}
+
+def bench_generate_map(results: dict, repeat: int) -> None:
+    """Map generation across map sizes."""
+    for size in MAP_SIZES:
+        seeds = iter(range(10 ** 6))
+        results['generate_map/' + str(size)] = measure(
+            lambda size=size: main.generate_map(size, next(seeds)), repeat)
+
+def bench_a_star(results: dict, repeat: int) -> None:
+    """A* between the two most distant floor tiles of generated layouts."""
+    for size in MAP_SIZES:
+        layout = main.generate_map(size, size)
+        floor = [(i, j) for i in range(size) for j in range(size) if layout[i][j] != '#']
+        start, goal = floor[0], floor[-1]
+        results['a_star_search/' + str(size)] = measure(
+            lambda layout=layout, start=start, goal=goal:
+            main.Kamikaze.a_star_search(layout, start, goal), repeat)
+        graph = main.NavGraph(main.TileGrid(layout))
+        results['navgraph_path/' + str(size)] = measure(
+            lambda graph=graph, start=graph.node(*start), goal=graph.node(*goal):
+            graph.path(start, goal), repeat)
+
+def bench_collisions(results: dict, repeat: int) -> None:
+    """One collision pass of Player._collisions for a number of entities."""
+    layout = main.generate_map(main.MAP_SIZE, 0)
+    tiles = main.TileGrid(layout)
+    rng = random.Random(0)
+    floor = [(i, j) for i in range(main.MAP_SIZE) for j in range(main.MAP_SIZE)
+             if layout[i][j] == ' ']
+    for count in ENTITY_COUNTS:
+        players = []
+        for _ in range(count):
+            i, j = rng.choice(floor)
+            players.append(main.Player(j * main.TILE_SIZE + rng.randrange(main.TILE_SIZE),
+                                       (i + 1) * main.TILE_SIZE + rng.randrange(-8, 8)))
+
+        def collide(players=players):
+            for player in players:
+                player._collisions(tiles, 0)  # pylint: disable=protected-access
+                player._collisions(tiles, 1)  # pylint: disable=protected-access
+        results['collisions/' + str(count)] = measure(collide, repeat)
+
+def bench_enemies(results: dict, repeat: int) -> None:
+    """Ten enemy update steps of the sprite EnemyGroup and the array EnemyStore per roster size."""
+    plan = main.plan_level(3, 0)
+    for count in ROSTER_SIZES:
+        specs = main.plan_enemies(plan.layout, 3, random.Random(count), count)
+        for name, container in [('sprites', main.EnemyGroup), ('store', main.EnemyStore)]:
+            player = main.Player(*plan.spawn)
+            enemies = container([kind(x, y) for kind, x, y in specs]) \
+                if container is main.EnemyGroup else container(specs, seed=0)
+
+            def steps(player=player, enemies=enemies):
+                for _ in range(10):
+                    player.hp = 1024
+                    main.entity_update(main.SIM_STEP_MS / 1000, plan.tiles, player, enemies)
+                    enemies.reap()
+            results['enemies_' + name + '/' + str(count)] = measure(steps, repeat)
+
+def bench_draw(results: dict, repeat: int, screen: pygame.Surface) -> None:
+    """A full draw() frame with the camera moving every frame."""
+    random.seed(0)
+    plan = main.plan_level(3, 0)
+    view = main.LevelView(plan.layout)
+    player = main.Player(*plan.spawn)
+    enemies = main.spawn_enemies(plan.enemies)
+    offsets = iter(range(10 ** 6))
+
+    def frame():
+        camera_x, camera_y = main.update_camera(player, plan.layout, screen)
+        camera_x = max(camera_x - next(offsets) % 64, 0)
+        main.draw(screen, view, enemies, player, camera_x, camera_y, True)
+    results['draw/frame'] = measure(frame, repeat, 10)
+
+def bench_simulation(results: dict, repeat: int) -> None:
+    """Headless level() equivalent frames, reported per frame and as frames per second.
+
+    simulation/frame plays regular levels, simulation/frame_1024 levels of 1024 enemies
+    and simulation/store_1024 the same levels with an EnemyStore.
+    """
+    for name, enemies, store in [('simulation/frame', None, False),
+                                 ('simulation/frame_1024', 1024, False),
+                                 ('simulation/store_1024', 1024, True)]:
+        def run(enemies=enemies, store=store):
+            sim = Simulation(RandomInput(1), seed=1, enemies=enemies, store=store)
+            for _ in range(600):
+                if sim.step() != 'running':
+                    sim = Simulation(RandomInput(1), seed=1, enemies=enemies, store=store)
+        stats = measure(run, max(repeat // 5, 1))
+        stats['median_ms'] /= 600
+        stats['min_ms'] /= 600
+        stats['frames_per_second'] = 1000 / stats['median_ms']
+        results[name] = stats
+
+def run(repeat: int) -> dict:
+    """Run every benchmark and return the results with some machine details."""
+    pygame.display.init()
+    screen = pygame.display.set_mode((main.SCREEN_WIDTH, main.SCREEN_HEIGHT))
+    results = {}
+    bench_generate_map(results, repeat)
+    bench_a_star(results, repeat)
+    bench_collisions(results, repeat)
+    bench_enemies(results, repeat)
+    bench_draw(results, repeat, screen)
+    bench_simulation(results, repeat)
+    return {'machine': {'python': platform.python_version(), 'pygame': pygame.version.ver,
+                        'platform': platform.platform()},
+            'results': results}
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Return the benchmarks whose median slowed down by more than tolerance."""
+    regressions = []
+    for name, stats in report['results'].items():
+        old = baseline['results'].get(name)
+        if old and stats['median_ms'] > old['median_ms'] * (1 + tolerance):
+            regressions.append((name, old['median_ms'], stats['median_ms']))
+    return regressions
+
+def main_cli() -> None:
+    """Command line entry point, exits with status 1 on regressions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--out', default='bench_results.json', help='where to write results')
+    parser.add_argument('--baseline', default='bench_baseline.json',
+                        help='stored results to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed median slowdown, 0.2 is 20%%')
+    args = parser.parse_args()
+
+    report = run(args.repeat)
+    with open(args.out, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    for name, stats in report['results'].items():
+        print(name.ljust(24) + format(stats['median_ms'], '10.3f') + ' ms')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for name, old, new in regressions:
+            print('REGRESSION ' + name + ': ' + format(old, '.3f') + ' -> ' +
+                  format(new, '.3f') + ' ms')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main_cli()
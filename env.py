@@ -0,0 +1,201 @@
+"""This module steps many headless games in lockstep as a vectorized environment for bots."""
+import argparse
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+import main
+from levelformat import encode_layout
+from main import FrameInput, TILE_SIZE
+from simulation import Simulation
+
+VIEW_RADIUS = 4
+MAX_ENEMIES = 16
+REWARDS = {'scene': 1.0, 'won': 1.0, 'dead': -1.0}
+
+class VectorEnv:
+    """N independent Simulations stepped in lockstep with batched observations.
+
+    step() takes an (N, 3) integer array of move (-1, 0 or 1), jump (0 or 1)
+    and attack (0 or 1) per game, out of range values are clipped.
+    Observations are written into arrays allocated once and returned on
+    every call:
+
+    tiles    (N, 2r+1, 2r+1) uint8 tile codes of levelformat.TILE_CODES
+             around the player, walls outside the map
+    enemies  (N, MAX_ENEMIES, 3) float32 offset in tiles from the player and
+             HP of the nearest enemies in no particular order, zero padded
+    count    (N,) int32 number of enemies in the enemies rows
+    hp       (N, 2) int32 player HP and boss HP, 0 outside the boss fight
+    scene    (N,) int8 scene id
+
+    Rewards are REWARDS['scene'] per level cleared, REWARDS['won'] for
+    beating the boss and REWARDS['dead'] for dying. Finished games, or games
+    reaching max_frames, are reset at once with the next episode seed, and
+    their done flag is set for that step. Every game draws from a random
+    state of its own seeded with its episode seed, so an episode plays the
+    same whatever the other games do.
+    """
+    # FrameInput of every clipped action, indexed by 4 * (move + 1) + 2 * jump + attack.
+    FRAMES = tuple(FrameInput(move, jumps, attacks)
+                   for move in (-1, 0, 1) for jumps in (0, 1) for attacks in (0, 1))
+    ACTION_LOW = np.array([-1, 0, 0])
+    ACTION_HIGH = np.array([1, 1, 1])
+    ACTION_WEIGHTS = np.array([4, 2, 1])
+
+    def __init__(self, count: int, seed: int = 0, max_frames: Optional[int] = 216000,
+                 radius: int = VIEW_RADIUS, max_enemies: int = MAX_ENEMIES, levels=None):
+        self.count = count
+        self.max_frames = max_frames
+        self.radius = radius
+        self.levels = levels
+        self.next_seed = seed
+        self.sims = [None] * count
+        self._grids = [None] * count
+        size = 2 * radius + 1
+        self.obs: Dict[str, np.ndarray] = {
+            'tiles': np.ones((count, size, size), dtype=np.uint8),
+            'enemies': np.zeros((count, max_enemies, 3), dtype=np.float32),
+            'count': np.zeros(count, dtype=np.int32),
+            'hp': np.zeros((count, 2), dtype=np.int32),
+            'scene': np.zeros(count, dtype=np.int8),
+        }
+        self.rewards = np.zeros(count, dtype=np.float32)
+        self.dones = np.zeros(count, dtype=bool)
+        self.outcomes = [None] * count
+        self._actions = np.zeros((count, 3), dtype=np.int64)
+        self._codes = np.zeros(count, dtype=np.int64)
+        self._rows = np.zeros((0, 3), dtype=np.float32)
+        self._distance = np.zeros((0, 2), dtype=np.float32)
+        self._sums = np.zeros(0, dtype=np.float32)
+
+    def reset(self) -> Dict[str, np.ndarray]:
+        """Start a new episode in every game and return the observations."""
+        for index in range(self.count):
+            self._reset(index)
+        return self.obs
+
+    def _reset(self, index: int) -> None:
+        self.sims[index] = Simulation(None, seed=self.next_seed, levels=self.levels)
+        self.next_seed += 1
+        self._observe(index)
+
+    def _grid(self, index: int, sim: Simulation) -> np.ndarray:
+        """Tile codes of the current level, padded with radius walls."""
+        tiles, grid = self._grids[index] or (None, None)
+        if tiles is not sim.tiles:
+            grid = np.pad(encode_layout(sim.layout), self.radius, constant_values=1)
+            self._grids[index] = sim.tiles, grid
+        return grid
+
+    def _observe(self, index: int) -> None:
+        sim = self.sims[index]
+        player = sim.player
+        row, col = sim.tiles.tile_at(player.rect.centerx, player.rect.centery)
+        row = min(max(row, 0), sim.tiles.rows - 1)
+        col = min(max(col, 0), sim.tiles.cols - 1)
+        size = 2 * self.radius + 1
+        self.obs['tiles'][index] = self._grid(index, sim)[row:row + size, col:col + size]
+        self.obs['scene'][index] = sim.scene_id
+        self.obs['hp'][index, 0] = player.hp
+        self.obs['hp'][index, 1] = sim.enemies.hp if sim.boss else 0
+        self.obs['count'][index] = self._enemies(self.obs['enemies'][index], sim)
+
+    def _scratch(self, size: int) -> np.ndarray:
+        """Enemy row buffer of at least size rows, grown by doubling."""
+        if len(self._rows) < size:
+            size = max(size, 2 * len(self._rows))
+            self._rows = np.zeros((size, 3), dtype=np.float32)
+            self._distance = np.zeros((size, 2), dtype=np.float32)
+            self._sums = np.zeros(size, dtype=np.float32)
+        return self._rows
+
+    def _enemies(self, out: np.ndarray, sim: Simulation) -> int:
+        """Write the nearest enemies of a game into out and return how many were written."""
+        center_x, center_y = sim.player.rect.center
+        enemies = sim.enemies
+        if sim.boss:
+            found = 1
+            rows = self._scratch(found)
+            rows[0, 0] = enemies.rect.centerx
+            rows[0, 1] = enemies.rect.centery
+            rows[0, 2] = enemies.hp
+        elif isinstance(enemies, main.EnemyStore):
+            found = len(enemies.hp)
+            rows = self._scratch(found)
+            np.multiply(enemies.size, 0.5, out=rows[:found, :2], casting='unsafe')
+            rows[:found, :2] += enemies.pos
+            rows[:found, 2] = enemies.hp
+        else:
+            found = len(enemies)
+            rows = self._scratch(found)
+            for row, enemy in enumerate(enemies):
+                rows[row, 0] = enemy.rect.centerx
+                rows[row, 1] = enemy.rect.centery
+                rows[row, 2] = enemy.hp
+        rows[:found, 0] -= center_x
+        rows[:found, 1] -= center_y
+        if found > len(out):
+            distance = np.abs(rows[:found, :2], out=self._distance[:found])
+            distance.sum(axis=1, out=self._sums[:found])
+            nearest = np.argpartition(self._sums[:found], len(out) - 1)[:len(out)]
+            np.take(rows, nearest, axis=0, out=out)
+            found = len(out)
+        else:
+            out[:found] = rows[:found]
+        out[:found, :2] /= TILE_SIZE
+        out[found:] = 0
+        return found
+
+    def step(self, actions: np.ndarray):
+        """Advance every game by one fixed step and return (observations, rewards, dones)."""
+        self.rewards[:] = 0
+        self.dones[:] = False
+        np.clip(actions, self.ACTION_LOW, self.ACTION_HIGH, out=self._actions, casting='unsafe')
+        np.matmul(self._actions, self.ACTION_WEIGHTS, out=self._codes)
+        self._codes += 4
+        for index in range(self.count):
+            sim = self.sims[index]
+            scene_id = sim.scene_id
+            status = sim.step(self.FRAMES[self._codes[index]])
+            if sim.scene_id != scene_id:
+                self.rewards[index] += REWARDS['scene']
+            if status == 'running' and self.max_frames is not None \
+                    and sim.frames >= self.max_frames:
+                status = 'timeout'
+            if status != 'running':
+                self.rewards[index] += REWARDS.get(status, 0.0)
+                self.dones[index] = True
+                self.outcomes[index] = status
+                self._reset(index)
+            else:
+                self._observe(index)
+        return self.obs, self.rewards, self.dones
+
+def main_cli() -> None:
+    """Command line entry point measuring environment steps per second under random actions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--envs', type=int, default=64, help='games stepped in lockstep')
+    parser.add_argument('--steps', type=int, default=1000, help='lockstep steps to run')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    env = VectorEnv(args.envs, args.seed)
+    env.reset()
+    rng = np.random.default_rng(args.seed)
+    actions = np.zeros((args.envs, 3), dtype=np.int64)
+    episodes = 0
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        actions[:, 0] = rng.integers(-1, 2, args.envs)
+        actions[:, 1:] = rng.random((args.envs, 2)) < (0.05, 0.1)
+        _, _, dones = env.step(actions)
+        episodes += int(dones.sum())
+    seconds = time.perf_counter() - start
+    print(str(args.envs * args.steps) + ' steps in ' + format(seconds, '.2f') + ' s (' +
+          format(args.envs * args.steps / seconds, '.0f') + ' steps/s), ' +
+          str(episodes) + ' episodes finished')
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,135 @@
+"""This module reads and writes level libraries, a compact memory-mapped level format."""
+import argparse
+import mmap
+import random
+import struct
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b'GLV1'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+RECORD = struct.Struct('<BHHiiHHH')
+ENEMY = np.dtype([('kind', 'u1'), ('x', '<i4'), ('y', '<i4')])
+TILE_CODES = ' #E'
+NO_EXIT = 0xFFFF
+
+_ENCODE = np.zeros(256, dtype=np.uint8)
+for _code, _char in enumerate(TILE_CODES):
+    _ENCODE[ord(_char)] = _code
+_DECODE = np.array(list(TILE_CODES))
+
+class Level(NamedTuple):
+    """One level of a library.
+
+    tiles holds one byte per tile, indexes into TILE_CODES. solid is the
+    precomputed collision and navigation grid, True for walls. enemies is an
+    ENEMY record array of (kind, x, y) spawns.
+    """
+    scene_id: int
+    tiles: np.ndarray
+    solid: np.ndarray
+    spawn: tuple
+    exit: Optional[tuple]
+    enemies: np.ndarray
+
+def encode_layout(layout: List[List[str]]) -> np.ndarray:
+    """Tile codes of a layout."""
+    chars = np.frombuffer(''.join(map(''.join, layout)).encode('ascii'), dtype=np.uint8)
+    return _ENCODE[chars].reshape(len(layout), len(layout[0]))
+
+def decode_layout(tiles: np.ndarray) -> List[List[str]]:
+    """Layout of tile codes."""
+    return _DECODE[tiles].tolist()
+
+def pack_level(level: Level) -> bytes:
+    """Pack a level into a library record.
+
+    The record is a RECORD header followed by the tile bytes, the solid grid
+    packed into bits and the enemy records.
+    """
+    rows, cols = level.tiles.shape
+    exit_row, exit_col = level.exit or (NO_EXIT, NO_EXIT)
+    return b''.join([RECORD.pack(level.scene_id, rows, cols, *level.spawn, exit_row, exit_col,
+                                 len(level.enemies)),
+                     level.tiles.astype(np.uint8).tobytes(),
+                     np.packbits(level.solid).tobytes(),
+                     np.asarray(level.enemies, dtype=ENEMY).tobytes()])
+
+def write_library(path: str, levels: Sequence[Level]) -> None:
+    """Write levels to a library file: a HEADER, one uint64 offset per level, then the records."""
+    records = [pack_level(level) for level in levels]
+    offset = HEADER.size + 8 * len(records)
+    offsets = []
+    for record in records:
+        offsets.append(offset)
+        offset += len(record)
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        file.write(np.array(offsets, dtype='<u8').tobytes())
+        for record in records:
+            file.write(record)
+
+class LevelLibrary:
+    """Level library file mapped read-only.
+
+    Tiles and enemies of a level are zero-copy views into the mapping, only
+    the bit-packed solid grid is unpacked.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not a level library')
+        self.offsets = np.frombuffer(self._map, '<u8', count, HEADER.size)
+        self._scenes: Dict[int, List[int]] = {}
+        for index, offset in enumerate(self.offsets.tolist()):
+            self._scenes.setdefault(self._map[offset], []).append(index)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> Level:
+        offset = int(self.offsets[index])
+        scene_id, rows, cols, spawn_x, spawn_y, exit_row, exit_col, count = \
+            RECORD.unpack_from(self._map, offset)
+        offset += RECORD.size
+        tiles = np.frombuffer(self._map, np.uint8, rows * cols, offset).reshape(rows, cols)
+        offset += rows * cols
+        bits = np.frombuffer(self._map, np.uint8, (rows * cols + 7) // 8, offset)
+        solid = np.unpackbits(bits, count=rows * cols).reshape(rows, cols).view(bool)
+        enemies = np.frombuffer(self._map, ENEMY, count, offset + len(bits))
+        return Level(scene_id, tiles, solid, (spawn_x, spawn_y),
+                     None if exit_row == NO_EXIT else (exit_row, exit_col), enemies)
+
+    def scenes(self, scene_id: int) -> List[int]:
+        """Indexes of the levels of a scene."""
+        return self._scenes.get(scene_id, [])
+
+def main_cli() -> None:
+    """Command line entry point baking generated levels into a library."""
+    import main  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('out', help='library file to write')
+    parser.add_argument('--scenes', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--count', type=int, default=16, help='levels per scene')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first level')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    write_library(args.out, [main.bake_level(main.plan_level(scene_id, rng.getrandbits(64)))
+                             for scene_id in args.scenes for _ in range(args.count)])
+    start = time.perf_counter()
+    library = LevelLibrary(args.out)
+    plans = [main.load_level(library[index]) for index in range(len(library))]
+    seconds = time.perf_counter() - start
+    print('Wrote ' + str(len(plans)) + ' levels to ' + args.out + ', loaded in ' +
+          format(seconds * 1000, '.2f') + ' ms')
+
+if __name__ == '__main__':
+    main_cli()
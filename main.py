@@ -1,10 +1,26 @@
 """This module contains a simple game using pygame."""
+# pylint: disable=wrong-import-position
+from time import perf_counter
+STARTED = perf_counter()
+import argparse
+import os
 import random
 import math
-from typing import List
+import struct
+from typing import List, NamedTuple
 import heapq
+from operator import attrgetter
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pygame
-from pygame import K_a, K_d, K_SPACE, K_ESCAPE, KEYUP, QUIT, MOUSEBUTTONDOWN
+from pygame import K_a, K_d, K_SPACE, K_ESCAPE, K_F3, KEYUP, KEYDOWN, QUIT, MOUSEBUTTONDOWN
+from pygame import VIDEOEXPOSE, WINDOWEXPOSED
+from assets import Assets
+import levelformat
+from profiler import FrameProfiler
+from telemetry import Telemetry
+IMPORTED = perf_counter()
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -16,15 +32,488 @@ SCREEN_WIDTH = 1920
 SCREEN_HEIGHT = 1080
 TILE_SIZE = 256
 MAP_SIZE = 17
-ATTACK = False
+CHUNK_TILES = 2
+LOD_PERIODS = (1, 2, 3)
+SIM_STEP_MS = 16
+MAX_STEPS = 5
+MAX_FPS = 120
+PROFILER = FrameProfiler(enabled=bool(os.environ.get('GAME_PROFILE')))
+RECORDER = None
+TELEMETRY = Telemetry()
+IO = ThreadPoolExecutor(max_workers=1, thread_name_prefix='io')
+ASSETS = Assets()
+SPRITES = ['player', 'sword', 'kamikaze', 'slasher', 'scarecrow']
+BOSS_LAYOUT = [['#', '#', '#', '#', '#', '#', '#', '#'],
+               ['#', ' ', ' ', ' ', ' ', ' ', ' ', '#'],
+               ['#', ' ', ' ', ' ', ' ', ' ', ' ', '#'],
+               ['#', ' ', ' ', ' ', ' ', ' ', ' ', '#'],
+               ['#', '#', '#', '#', '#', '#', '#', '#']]
+
+class LevelPlan(NamedTuple):
+    """Layout, spawn point and enemy roster of a level, ready to be played."""
+    scene_id: int
+    layout: List[List[str]]
+    tiles: 'TileGrid'
+    spawn: tuple
+    enemies: list
+
+class FrameInput(NamedTuple):
+    """Player input consumed during one frame."""
+    move: int = 0
+    jumps: int = 0
+    attacks: int = 0
+    drains: int = 0
+    quit: bool = False
+
+class TileGrid:
+    """Per-level tile index used for collision and exit checks."""
+    def __init__(self, layout: List[List[str]], solid: np.ndarray = None):
+        self.layout = layout
+        self.rows = len(layout)
+        self.cols = len(layout[0])
+        self._rects = [[pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+                        if tile in ['#', 'E'] else None for x, tile in enumerate(row)]
+                       for y, row in enumerate(layout)]
+        self.exits = [self._rects[y][x] for y, row in enumerate(layout)
+                      for x, tile in enumerate(row) if tile == 'E']
+        self.solid = np.array([[tile == '#' for tile in row] for row in layout]) \
+            if solid is None else solid
+        self.pathfinder = Pathfinder(self)
+
+    def tile(self, row: int, col: int) -> str:
+        """Return the tile at the grid position, walls outside the map."""
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self.layout[row][col]
+        return '#'
+
+    def set_tile(self, row: int, col: int, tile: str) -> None:
+        """Change one tile, updating the collision index and navigation graph in place."""
+        old = self.layout[row][col]
+        if tile == old:
+            return
+        self.layout[row][col] = tile
+        rect = self._rects[row][col] or pygame.Rect(col * TILE_SIZE, row * TILE_SIZE,
+                                                     TILE_SIZE, TILE_SIZE)
+        self._rects[row][col] = rect if tile in ['#', 'E'] else None
+        if old == 'E':
+            self.exits.remove(rect)
+        if tile == 'E':
+            self.exits.append(rect)
+        self.solid[row, col] = tile == '#'
+        self.pathfinder.update(row, col)
+
+    def tile_at(self, position_x: int, position_y: int):
+        """Return the (row, col) grid position of a world point."""
+        return int(position_y // TILE_SIZE), int(position_x // TILE_SIZE)
+
+    def colliding(self, rect: pygame.Rect, kind: str = '#') -> List[pygame.Rect]:
+        """Return the rects of tiles of the given kind overlapping rect."""
+        top = max(rect.top // TILE_SIZE, 0)
+        bottom = min((rect.bottom - 1) // TILE_SIZE, self.rows - 1)
+        left = max(rect.left // TILE_SIZE, 0)
+        right = min((rect.right - 1) // TILE_SIZE, self.cols - 1)
+        tiles = []
+        for y in range(top, bottom + 1):
+            row = self.layout[y]
+            for x in range(left, right + 1):
+                if row[x] == kind:
+                    tiles.append(self._rects[y][x])
+        return tiles
+
+class NavGraph:
+    """Walkable tiles of a TileGrid as integer nodes in flat adjacency arrays.
+
+    Floor tiles get node ids in row-major order. node_of maps a flat tile
+    index, row * cols + col, to its node id or -1 for walls, and tile_of maps
+    node ids back. adjacent holds four entries per node: the neighbors above,
+    below, left and right, or -1. jumps and jump_costs hold, for each node and
+    direction, the first node reached that is not inside a straight corridor
+    and its distance, so path() crosses a corridor in one expansion. update()
+    patches the arrays around a changed tile.
+    """
+    STEPS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+    def __init__(self, tiles: TileGrid):
+        self.rows = tiles.rows
+        self.cols = tiles.cols
+        self.node_of = [-1] * (self.rows * self.cols)
+        self.tile_of = []
+        for index, tile in enumerate(tile for row in tiles.layout for tile in row):
+            if tile != '#':
+                self.node_of[index] = len(self.tile_of)
+                self.tile_of.append(index)
+        self.adjacent = [-1] * (4 * len(self.tile_of))
+        self.jumps = [-1] * len(self.adjacent)
+        self.jump_costs = [0] * len(self.adjacent)
+        for node in range(len(self.tile_of)):
+            self._link(node)
+        for row in range(self.rows):
+            self._jump_row(row)
+        for col in range(self.cols):
+            self._jump_col(col)
+
+    def __len__(self) -> int:
+        return len(self.tile_of)
+
+    def node(self, row: int, col: int) -> int:
+        """Node id of a tile, -1 for walls and tiles outside the map."""
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self.node_of[row * self.cols + col]
+        return -1
+
+    def tile(self, node: int):
+        """(row, col) of a node."""
+        return divmod(self.tile_of[node], self.cols)
+
+    def _link(self, node: int) -> None:
+        row, col = self.tile(node)
+        for direction, (d_row, d_col) in enumerate(self.STEPS):
+            self.adjacent[4 * node + direction] = self.node(row + d_row, col + d_col)
+
+    def _straight(self, node: int, axis: int) -> bool:
+        up, down, left, right = self.adjacent[4 * node:4 * node + 4]
+        if axis == 0:
+            return up >= 0 and down >= 0 and left < 0 and right < 0
+        return left >= 0 and right >= 0 and up < 0 and down < 0
+
+    def _jump_line(self, nodes: list, backward: int, forward: int, axis: int) -> None:
+        for direction, order in [(forward, reversed(nodes)), (backward, nodes)]:
+            for node in order:
+                if node < 0:
+                    continue
+                entry = 4 * node + direction
+                near = self.adjacent[entry]
+                if near >= 0 and self._straight(near, axis):
+                    self.jumps[entry] = self.jumps[4 * near + direction]
+                    self.jump_costs[entry] = self.jump_costs[4 * near + direction] + 1
+                else:
+                    self.jumps[entry] = near
+                    self.jump_costs[entry] = 1 if near >= 0 else 0
+
+    def _jump_row(self, row: int) -> None:
+        self._jump_line(self.node_of[row * self.cols:(row + 1) * self.cols], 2, 3, 1)
+
+    def _jump_col(self, col: int) -> None:
+        self._jump_line(self.node_of[col::self.cols], 0, 1, 0)
+
+    def update(self, row: int, col: int, walkable: bool) -> None:
+        """Add or remove the node of a tile that became floor or wall.
+
+        Removed node ids are retired, their tile_of entry becomes -1.
+        """
+        index = row * self.cols + col
+        node = self.node_of[index]
+        if walkable == (node >= 0):
+            return
+        if walkable:
+            node = self.node_of[index] = len(self.tile_of)
+            self.tile_of.append(index)
+            self.adjacent += [-1] * 4
+            self.jumps += [-1] * 4
+            self.jump_costs += [0] * 4
+            self._link(node)
+        else:
+            self.node_of[index] = self.tile_of[node] = -1
+            self.adjacent[4 * node:4 * node + 4] = [-1] * 4
+            self.jumps[4 * node:4 * node + 4] = [-1] * 4
+        for d_row, d_col in self.STEPS:
+            near = self.node(row + d_row, col + d_col)
+            if near >= 0:
+                self._link(near)
+        for line in range(max(row - 1, 0), min(row + 2, self.rows)):
+            self._jump_row(line)
+        for line in range(max(col - 1, 0), min(col + 2, self.cols)):
+            self._jump_col(line)
+
+    def _corridor(self, node: int):
+        """Axis and (backward, forward) end nodes of the corridor a node is inside, if any."""
+        for axis in (0, 1):
+            if self._straight(node, axis):
+                return axis, (self.jumps[4 * node + 2 * axis], self.jumps[4 * node + 2 * axis + 1])
+        return None
+
+    def path(self, start: int, goal: int) -> list:
+        """Shortest path of (row, col) tiles from start to goal node, [] if there is none.
+
+        A* over corridor ends. A goal inside a corridor is reached from the
+        two corridor ends, a start inside one leaves through both.
+        """
+        if start < 0 or goal < 0:
+            return []
+        corridor = self._corridor(goal)
+        if start == goal or corridor is not None and corridor == self._corridor(start):
+            return self._walk([start, goal])
+
+        goal_ends = {}
+        if corridor is not None:
+            axis = corridor[0]
+            for direction in (2 * axis, 2 * axis + 1):
+                goal_ends[self.jumps[4 * goal + direction]] = \
+                    self.jump_costs[4 * goal + direction]
+        goal_row, goal_col = self.tile(goal)
+        costs = {start: 0}
+        came_from = {start: -1}
+        frontier = [(0, start)]
+        while frontier:
+            _, node = heapq.heappop(frontier)
+            if node == goal:
+                break
+            cost = costs[node]
+            edges = [(self.jumps[4 * node + d], self.jump_costs[4 * node + d]) for d in range(4)]
+            if node in goal_ends:
+                edges.append((goal, goal_ends[node]))
+            for near, step in edges:
+                if near >= 0 and cost + step < costs.get(near, cost + step + 1):
+                    costs[near] = cost + step
+                    came_from[near] = node
+                    row, col = self.tile(near)
+                    heapq.heappush(frontier, (cost + step + abs(goal_row - row) +
+                                              abs(goal_col - col), near))
+        if goal not in came_from:
+            return []
+
+        nodes = [goal]
+        while came_from[nodes[-1]] >= 0:
+            nodes.append(came_from[nodes[-1]])
+        return self._walk(nodes[::-1])
+
+    def _walk(self, nodes: list) -> list:
+        """Tiles along straight segments between consecutive nodes."""
+        path = [self.tile(nodes[0])]
+        for node in nodes[1:]:
+            row, col = path[-1]
+            end_row, end_col = self.tile(node)
+            d_row, d_col = (end_row > row) - (end_row < row), (end_col > col) - (end_col < col)
+            while (row, col) != (end_row, end_col):
+                row, col = row + d_row, col + d_col
+                path.append((row, col))
+        return path
+
+class Pathfinder:
+    """Per-level pathfinding on a NavGraph, shared by all enemies chasing one target tile."""
+    def __init__(self, tiles: TileGrid):
+        self.tiles = tiles
+        self.graph = NavGraph(tiles)
+        self.target = None
+        self._field = None
+        self._directions = None
+        self._paths = {}
+
+    def retarget(self, target) -> None:
+        """Point the service at a new target tile, dropping stale results."""
+        if target != self.target:
+            self.target = target
+            self._field = None
+            self._directions = None
+            self._paths.clear()
+
+    def update(self, row: int, col: int) -> None:
+        """Follow a tile change of the grid, dropping every cached result."""
+        self.graph.update(row, col, self.tiles.tile(row, col) != '#')
+        self._field = None
+        self._directions = None
+        self._paths.clear()
+
+    def _flow_field(self) -> List[int]:
+        if self._field is None:
+            graph = self.graph
+            field = [-1] * len(graph)
+            target = graph.node(*self.target)
+            if target >= 0:
+                field[target] = 0
+                frontier = deque([target])
+                adjacent = graph.adjacent
+                while frontier:
+                    node = frontier.popleft()
+                    dist = field[node] + 1
+                    for near in adjacent[4 * node:4 * node + 4]:
+                        if near >= 0 and field[near] < 0:
+                            field[near] = dist
+                            frontier.append(near)
+            self._field = field
+        return self._field
+
+    def distance(self, start, target) -> int:
+        """Tile distance from start to target, -1 if unreachable."""
+        self.retarget(target)
+        node = self.graph.node(*start)
+        return self._flow_field()[node] if node >= 0 else -1
+
+    def next_step(self, start, target):
+        """Next tile on a shortest path from start to target, None if there is none."""
+        dist = self.distance(start, target)
+        if dist <= 0:
+            return None
+        field = self._flow_field()
+        node = self.graph.node(*start)
+        for near in self.graph.adjacent[4 * node:4 * node + 4]:
+            if near >= 0 and field[near] == dist - 1:
+                return self.graph.tile(near)
+        return None
+
+    def directions(self, target):
+        """Per-tile (row, col) step arrays of the flow field towards target."""
+        self.retarget(target)
+        if self._directions is None:
+            tile_of = np.array(self.graph.tile_of, dtype=np.int64)
+            alive = tile_of >= 0
+            field = np.full(self.tiles.rows * self.tiles.cols, -1)
+            field[tile_of[alive]] = np.array(self._flow_field())[alive]
+            field = field.reshape(self.tiles.rows, self.tiles.cols)
+            padded = np.pad(field, 1, constant_values=-1)
+            step_row = np.zeros(field.shape, dtype=np.int8)
+            step_col = np.zeros(field.shape, dtype=np.int8)
+            todo = field > 0
+            for d_row, d_col in NavGraph.STEPS:
+                near = padded[1 + d_row:padded.shape[0] - 1 + d_row,
+                              1 + d_col:padded.shape[1] - 1 + d_col]
+                found = todo & (near == field - 1)
+                step_row[found], step_col[found] = d_row, d_col
+                todo &= ~found
+            self._directions = step_row, step_col
+        return self._directions
+
+    def path(self, start, target) -> list:
+        """Memoized shortest path of tiles from start to target."""
+        self.retarget(target)
+        if start not in self._paths:
+            self._paths[start] = self.graph.path(self.graph.node(*start),
+                                                 self.graph.node(*target))
+        return self._paths[start]
+
+class LevelView:
+    """Level geometry pre-rendered into cached chunk surfaces, with dirty-rect tracking."""
+    def __init__(self, layout: List[List[str]], max_chunks: int = 32):
+        self.layout = layout
+        self.max_chunks = max_chunks
+        self.chunk_size = CHUNK_TILES * TILE_SIZE
+        self.rect = pygame.Rect(0, 0, len(layout[0]) * TILE_SIZE, len(layout) * TILE_SIZE)
+        self._chunks = OrderedDict()
+        self._camera = None
+        self._dirty = []
+
+    def _chunk(self, chunk_x: int, chunk_y: int) -> pygame.Surface:
+        key = (chunk_x, chunk_y)
+        if key in self._chunks:
+            self._chunks.move_to_end(key)
+            return self._chunks[key]
+
+        chunk = pygame.Surface((self.chunk_size, self.chunk_size))
+        if pygame.display.get_surface() is not None:
+            chunk = chunk.convert()
+        chunk.fill(BLACK)
+        for y in range(chunk_y * CHUNK_TILES, min((chunk_y + 1) * CHUNK_TILES, len(self.layout))):
+            row = self.layout[y]
+            for x in range(chunk_x * CHUNK_TILES, min((chunk_x + 1) * CHUNK_TILES, len(row))):
+                if row[x] in ['#', 'E']:
+                    tile_rect = pygame.Rect((x - chunk_x * CHUNK_TILES) * TILE_SIZE,
+                                            (y - chunk_y * CHUNK_TILES) * TILE_SIZE,
+                                            TILE_SIZE, TILE_SIZE)
+                    pygame.draw.rect(chunk, WHITE if row[x] == '#' else YELLOW, tile_rect)
+
+        self._chunks[key] = chunk
+        if len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    def invalidate(self, row: int, col: int) -> None:
+        """Redraw a changed tile on the next frame."""
+        self._chunks.pop((col // CHUNK_TILES, row // CHUNK_TILES), None)
+        self._camera = None
+
+    def blit(self, screen: pygame.Surface, camera_x: int, camera_y: int, area=None) -> None:
+        """Blit the background under a screen area, the whole screen by default."""
+        area = screen.get_rect() if area is None else area.clip(screen.get_rect())
+        world = area.move(camera_x, camera_y)
+        if not self.rect.contains(world):
+            screen.fill(BLACK, area)
+        world = world.clip(self.rect)
+        if not world.width or not world.height:
+            return
+
+        size = self.chunk_size
+        for chunk_y in range(world.top // size, (world.bottom - 1) // size + 1):
+            for chunk_x in range(world.left // size, (world.right - 1) // size + 1):
+                part = world.clip(pygame.Rect(chunk_x * size, chunk_y * size, size, size))
+                screen.blit(self._chunk(chunk_x, chunk_y), (part.x - camera_x, part.y - camera_y),
+                            part.move(-chunk_x * size, -chunk_y * size))
+
+    def refresh(self, screen: pygame.Surface, camera_x: int, camera_y: int,
+                rects: List[pygame.Rect]) -> List[pygame.Rect]:
+        """Repaint the background behind changed screen rects and return them.
+
+        The whole screen is repainted when the camera moved since the last frame,
+        otherwise only the rects of this frame and of the previous one.
+        """
+        rects = [rect.copy() for rect in rects]
+        if (camera_x, camera_y) != self._camera:
+            self.blit(screen, camera_x, camera_y)
+            dirty = [screen.get_rect()]
+        else:
+            dirty = self._dirty + rects
+            for rect in dirty:
+                self.blit(screen, camera_x, camera_y, rect)
+        self._camera = (camera_x, camera_y)
+        self._dirty = rects
+        return dirty
+
+class ArenaView(LevelView):
+    """LevelView of a static arena seen from a fixed camera, pre-baked into one screen surface."""
+    def __init__(self, layout: List[List[str]]):
+        super().__init__(layout)
+        self._background = None
+        self._baked = None
+
+    def blit(self, screen: pygame.Surface, camera_x: int, camera_y: int, area=None) -> None:
+        if self._baked != (camera_x, camera_y) or self._background.get_size() != screen.get_size():
+            self._background = pygame.Surface(screen.get_size())
+            if pygame.display.get_surface() is not None:
+                self._background = self._background.convert()
+            super().blit(self._background, camera_x, camera_y)
+            self._baked = (camera_x, camera_y)
+            self._chunks.clear()
+        area = screen.get_rect() if area is None else area.clip(screen.get_rect())
+        screen.blit(self._background, area, area)
+
+    def invalidate(self, row: int, col: int) -> None:
+        super().invalidate(row, col)
+        self._baked = None
+
+class HealthBar:
+    """Retained HP bar widget, the bar surface is only re-rendered when the value changes."""
+    def __init__(self, rect: pygame.Rect, maximum: int):
+        self.rect = rect
+        self.maximum = maximum
+        self.value = None
+        self._surface = None
+
+    def changed(self, value: int) -> bool:
+        """Whether the bar shows a different value than the last one drawn."""
+        return value != self.value
+
+    def draw(self, screen: pygame.Surface, value: int) -> None:
+        """Blit the bar, re-rendering it first if value changed."""
+        if self._surface is None:
+            self._surface = pygame.Surface(self.rect.size)
+            if pygame.display.get_surface() is not None:
+                self._surface = self._surface.convert()
+        if value != self.value:
+            self.value = value
+            self._surface.fill("red")
+            fill = max(min(value / self.maximum, 1), 0)
+            self._surface.fill("green", (0, 0, self.rect.width * fill, self.rect.height))
+        screen.blit(self._surface, self.rect)
 
 class Player(pygame.sprite.Sprite):
     """Player sprite class."""
+    hp_bar = pygame.Rect(32, SCREEN_HEIGHT - 64, 256, 32)
+
     def __init__(self, position_x, position_y):
         super().__init__()
-        self.image = self._create_surface((64, 128), GREEN)
+        self.image = ASSETS.image('player', (64, 128), GREEN)
         self.rect = self.image.get_rect(centerx=position_x, bottom=position_y)
-        self.sword_image = self._create_surface((96, 96), BLUE)
+        self.previous = self.rect.topleft
+        self.sword_image = ASSETS.image('sword', (96, 96), BLUE)
         self.sword_rect = self.sword_image.get_rect(centerx=self.rect.centerx,
                                                     centery=self.rect.centery)
         self.vel = pygame.Vector2(0, 0)
@@ -32,33 +521,27 @@ class Player(pygame.sprite.Sprite):
         self.speed = 1024
         self.gravity = 16
         self.hp = 1024
+        self.health = HealthBar(self.hp_bar, 1024)
         self.direction = 0
+        self.attacked = False
 
-    @staticmethod
-    def _create_surface(size, color):
-        surface = pygame.Surface(size)
-        surface.fill(color)
-        return surface
-
-    def update(self, delta_time, layout):
+    def update(self, delta_time, tiles):
         """Player update function."""
         self.rect.x += self.vel.x * delta_time
         if self.direction == 1:
             self.sword_rect.left = self.rect.centerx
         elif self.direction == -1:
             self.sword_rect.right = self.rect.centerx
-        self._collisions(layout, 0)
+        self._collisions(tiles, 0)
         self.rect.y += self.vel.y * delta_time
         self.sword_rect.centery = self.rect.centery
-        self._collisions(layout, 1)
-
-    def _collisions(self, layout, direction):
-        for y, row in enumerate(layout):
-            for x, tile in enumerate(row):
-                if tile == '#':
-                    tile_rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                    if self.rect.colliderect(tile_rect):
-                        self._handle_collision(tile_rect, direction)
+        self._collisions(tiles, 1)
+
+    def _collisions(self, tiles, direction):
+        with PROFILER.section('collisions'):
+            for tile_rect in tiles.colliding(self.rect):
+                if self.rect.colliderect(tile_rect):
+                    self._handle_collision(tile_rect, direction)
         if direction == 1:
             self.vel.y += self.gravity
 
@@ -90,51 +573,45 @@ class Player(pygame.sprite.Sprite):
             self.vel.y = -self.speed
             self.jump_counter += 1
 
-    def attack(self, enemies, iterable: bool):
-        """Attack function."""
-        global ATTACK
-        if not ATTACK:
-            ATTACK = True
+    def attack(self, enemies, iterable: bool) -> int:
+        """Attack function, returns the number of enemies hit."""
+        self.attacked = True
         if iterable:
-            for enemy in enemies:
-                if self.sword_rect.colliderect(enemy.rect):
-                    enemy.hp -= 128
-                    if self.hp + 128 <= 1024:
-                        self.hp += 128
-                    else:
-                        self.hp = 1024
-        else:
-            if self.sword_rect.colliderect(enemies.rect):
-                enemies.hp -= 128
+            hits = enemies.hit(self.sword_rect, 128)
+            for _ in range(hits):
                 if self.hp + 128 <= 1024:
                     self.hp += 128
                 else:
                     self.hp = 1024
+            return hits
+        if self.sword_rect.colliderect(enemies.rect):
+            enemies.hp -= 128
+            if self.hp + 128 <= 1024:
+                self.hp += 128
+            else:
+                self.hp = 1024
+            return 1
+        return 0
 
-    def draw(self, screen):
+    def draw(self, screen, camera_x=0, camera_y=0):
         """Player draw function."""
-        screen.blit(self.image, self.rect)
-        screen.blit(self.sword_image, self.sword_rect)
-        pygame.draw.rect(screen, "red", (32, SCREEN_HEIGHT - 64, 256, 32))
-        pygame.draw.rect(screen, "green", (32, SCREEN_HEIGHT - 64, 256*(self.hp / 1024), 32))
+        screen.blit(self.image, (self.rect.x - camera_x, self.rect.y - camera_y))
+        screen.blit(self.sword_image, (self.sword_rect.x - camera_x, self.sword_rect.y - camera_y))
+        self.health.draw(screen, self.hp)
 
 class Kamikaze(pygame.sprite.Sprite):
     """Kamikaze sprite class."""
-    def __init__(self, position_x, position_y):
+    def __init__(self, position_x, position_y, rng=random):
         super().__init__()
-        self.image = self._create_surface((32, 32), RED)
+        self.rng = rng
+        self.image = ASSETS.image('kamikaze', (32, 32), RED)
         self.rect = self.image.get_rect(centerx = position_x, top = position_y)
+        self.previous = self.rect.topleft
         self.vel = pygame.Vector2(0, 0)
         self.speed = 2048
         self.hp = 128
         self.enable = False
 
-    @staticmethod
-    def _create_surface(size, color):
-        surface = pygame.Surface(size)
-        surface.fill(color)
-        return surface
-
     def enabled(self, player):
         """Enable movement function."""
         if TILE_SIZE >= (player.rect.centery - self.rect.centery) >= 0 and \
@@ -146,7 +623,8 @@ class Kamikaze(pygame.sprite.Sprite):
         """Heuristic function."""
         return abs(b[0] - a[0]) + abs(b[1] - a[1])
 
-    def neighbors(self, layout, current):
+    @staticmethod
+    def neighbors(layout, current):
         """Neighbors function."""
         x, y = current
         directions = [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
@@ -154,7 +632,8 @@ class Kamikaze(pygame.sprite.Sprite):
                         0 <= ny < len(layout[0]) and layout[nx][ny] != '#']
         return neighbors
 
-    def a_star_search(self, layout, start, goal):
+    @staticmethod
+    def a_star_search(layout, start, goal):
         """A* function."""
         frontier = []
         heapq.heappush(frontier, (0, start))
@@ -167,17 +646,18 @@ class Kamikaze(pygame.sprite.Sprite):
             if current == goal:
                 break
 
-            for i in self.neighbors(layout, current):
+            for i in Kamikaze.neighbors(layout, current):
                 new_cost = cost_so_far[current] + 1
                 if i not in cost_so_far or new_cost < cost_so_far[i]:
                     cost_so_far[i] = new_cost
-                    priority = new_cost + self.heuristic(goal, i)
+                    priority = new_cost + Kamikaze.heuristic(goal, i)
                     heapq.heappush(frontier, (priority, i))
                     came_from[i] = current
 
         return came_from, cost_so_far
 
-    def reconstruct_path(self, came_from, start, goal):
+    @staticmethod
+    def reconstruct_path(came_from, start, goal):
         """Reconstruct path function."""
         if goal not in came_from:
             return []
@@ -190,7 +670,7 @@ class Kamikaze(pygame.sprite.Sprite):
         path.reverse()
         return path
 
-    def move(self, player, layout, delta_time):
+    def move(self, player, tiles, delta_time):
         """Move towards the player."""
         if TILE_SIZE >= (player.rect.centery - self.rect.centery) >= 0 and \
             -1.5*TILE_SIZE <= (player.rect.centerx - self.rect.centerx) <= 1.5*TILE_SIZE:
@@ -198,51 +678,41 @@ class Kamikaze(pygame.sprite.Sprite):
                                         (player.rect.centery - self.rect.centery) / SCREEN_HEIGHT)
             self.vel = direction * self.speed
             self.rect.x += self.vel.x * delta_time
-            self._collisions(layout, 0)
+            self._collisions(tiles, 0)
             self.rect.y += self.vel.y * delta_time
-            self._collisions(layout, 1)
+            self._collisions(tiles, 1)
         else:
-            for y in range(len(layout)):
-                for x in range(len(layout)):
-                    tile_rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                    if tile_rect.top <= player.rect.centerx <= tile_rect.bottom and \
-                        tile_rect.left <= player.rect.centery <= tile_rect.right:
-                        player_pos = (x + 1, y + 1)
-                    if tile_rect.top <= self.rect.centerx <= tile_rect.bottom and \
-                        tile_rect.left <= self.rect.centery <= tile_rect.right:
-                        self_pos = (x + 1, y + 1)
-
-            came_from, _ = self.a_star_search(layout, self_pos, player_pos)
-            path = self.reconstruct_path(came_from, self_pos, player_pos)
-
-            if len(path) > 1:
-                next_step = path[1]
-                direction = pygame.Vector2((next_step[0] - self_pos[0]),
-                                            (next_step[1] - self_pos[1]))
-                print(direction)
+            self_pos = tiles.tile_at(self.rect.centerx, self.rect.centery)
+            player_pos = tiles.tile_at(player.rect.centerx, player.rect.centery)
+            with PROFILER.section('pathfinding'):
+                next_step = tiles.pathfinder.next_step(self_pos, player_pos)
+
+            if next_step is not None:
+                direction = pygame.Vector2((next_step[1] - self_pos[1]),
+                                            (next_step[0] - self_pos[0]))
+                if TELEMETRY.enabled:
+                    TELEMETRY.emit('path', start=self_pos, step=next_step, target=player_pos)
                 self.vel = direction * self.speed
                 self.rect.x += self.vel.x * delta_time
-                self._collisions(layout, 0)
+                self._collisions(tiles, 0)
                 self.rect.y += self.vel.y * delta_time
-                self._collisions(layout, 1)
+                self._collisions(tiles, 1)
 
-    def update(self, delta_time, layout, player):
-        """Kamikaze update function."""
-        if player.rect.colliderect(self.rect):
+    def update(self, delta_time, tiles, player, touching=None):
+        """Kamikaze update function, touching is the broad-phase contact result if known."""
+        if player.rect.colliderect(self.rect) if touching is None else touching:
             player.hp -= self.hp
             self.hp = 0
         if self.enable is False:
             self.enabled(player)
         else:
-            self.move(player, layout, delta_time)
+            self.move(player, tiles, delta_time)
 
-    def _collisions(self, layout, direction):
-        for y, row in enumerate(layout):
-            for x, tile in enumerate(row):
-                if tile == '#':
-                    tile_rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                    if self.rect.colliderect(tile_rect):
-                        self._handle_collision(tile_rect, direction)
+    def _collisions(self, tiles, direction):
+        with PROFILER.section('collisions'):
+            for tile_rect in tiles.colliding(self.rect):
+                if self.rect.colliderect(tile_rect):
+                    self._handle_collision(tile_rect, direction)
 
     def _handle_collision(self, tile_rect, direction):
         if direction == 0:
@@ -260,28 +730,24 @@ class Kamikaze(pygame.sprite.Sprite):
                 self.rect.top = tile_rect.bottom
                 self.vel.y = 0
 
-    def draw(self, screen):
+    def draw(self, screen, camera_x=0, camera_y=0):
         """Kamikaze draw function."""
-        screen.blit(self.image, self.rect)
+        screen.blit(self.image, (self.rect.x - camera_x, self.rect.y - camera_y))
 
 class Slasher(pygame.sprite.Sprite):
-    """Slasher sprite class."""
-    def __init__(self, position_x, position_y):
+    """Slasher sprite class, rolling its chances with rng."""
+    def __init__(self, position_x, position_y, rng=random):
         super().__init__()
-        self.image = self._create_surface((64, 128), RED)
+        self.rng = rng
+        self.image = ASSETS.image('slasher', (64, 128), RED)
         self.rect = self.image.get_rect(centerx = position_x, bottom = position_y)
-        self.sword_image = pygame.Surface((128, 64))
+        self.previous = self.rect.topleft
+        self.sword_image = ASSETS.solid((128, 64), BLACK)
         self.sword_rect = self.sword_image.get_rect(centerx=self.rect.centerx,
                                                     centery=self.rect.centery)
         self.enable = False
         self.hp = 256
 
-    @staticmethod
-    def _create_surface(size, color):
-        surface = pygame.Surface(size)
-        surface.fill(color)
-        return surface
-
     def enabled(self, player):
         """Enable movement function."""
         if TILE_SIZE >= (player.rect.centery - self.rect.centery) >= 0 and \
@@ -293,159 +759,509 @@ class Slasher(pygame.sprite.Sprite):
         self.rect.centerx = player.rect.centerx
         self.rect.centery = player.rect.centery
 
-    def update(self, delta_time, layout, player):
-        """Slasher update function."""
+    def update(self, delta_time, tiles, player, touching=None):
+        """Slasher update function, touching is the broad-phase contact result if known.
+
+        The 2.5% chances are per simulation step and compound over longer delta_time.
+        """
+        chance = 1 - 0.975 ** (delta_time * 1000 / SIM_STEP_MS)
         if self.enable is False:
             self.enabled(player)
-        elif random.random() < 0.025:
+        elif self.rng.random() < chance:
             self.move(player)
-        if random.random() < 0.025:
-            self.attack(player)
+            touching = True
+        if self.rng.random() < chance:
+            self.attack(player, touching)
         self.sword_rect.centerx = self.rect.centerx
         self.sword_rect.centery = self.rect.centery
 
-    def attack(self, player):
+    def attack(self, player, touching=None):
         """Attack function."""
-        if self.rect.colliderect(player.rect):
+        if self.rect.colliderect(player.rect) if touching is None else touching:
             player.hp -= 128
 
-    def draw(self, screen):
+    def draw(self, screen, camera_x=0, camera_y=0):
         """Slasher draw function."""
-        screen.blit(self.image, self.rect)
+        screen.blit(self.image, (self.rect.x - camera_x, self.rect.y - camera_y))
 
 class Scarecrow(pygame.sprite.Sprite):
-    """Scarecrow sprite class."""
-    def __init__(self, position_x, position_y):
+    """Scarecrow sprite class, rolling its chances with rng."""
+    hp_bar = pygame.Rect((SCREEN_WIDTH // 2) - 512, 32, 1024, 64)
+
+    def __init__(self, position_x, position_y, rng=random):
         super().__init__()
-        self.image = self._create_surface((96, 192), RED)
+        self.rng = rng
+        self.image = ASSETS.image('scarecrow', (96, 192), RED)
         self.rect = self.image.get_rect(centerx = position_x, bottom = position_y)
-        self.sword_image = pygame.Surface((128, 128))
+        self.previous = self.rect.topleft
+        self.sword_image = ASSETS.solid((128, 128), BLACK)
         self.sword_rect = self.sword_image.get_rect(centerx=self.rect.centerx,
                                                     centery=self.rect.centery)
         self.hp = 2048
-
-    @staticmethod
-    def _create_surface(size, color):
-        surface = pygame.Surface(size)
-        surface.fill(color)
-        return surface
+        self.health = HealthBar(self.hp_bar, 2048)
+        self.enable = True
 
     def move(self, player):
         """Move towards the player."""
         self.rect.centerx = player.rect.centerx
         self.rect.centery = player.rect.centery
 
-    def update(self, delta_time, layout, player):
-        """Slasher update function."""
-        if random.random() < 0.025:
+    def update(self, delta_time, tiles, player, touching=None):
+        """Scarecrow update function, touching is the broad-phase contact result if known.
+
+        The 2.5% chances are per simulation step and compound over longer delta_time.
+        """
+        chance = 1 - 0.975 ** (delta_time * 1000 / SIM_STEP_MS)
+        if self.rng.random() < chance:
             self.move(player)
-        if random.random() < 0.025:
-            self.attack(player)
+            touching = True
+        if self.rng.random() < chance:
+            self.attack(player, touching)
         self.sword_rect.centerx = self.rect.centerx
         self.sword_rect.centery = self.rect.centery
 
-    def attack(self, player):
+    def attack(self, player, touching=None):
         """Attack function."""
-        if self.rect.colliderect(player.rect):
+        if self.rect.colliderect(player.rect) if touching is None else touching:
             player.hp -= 128
 
-    def draw(self, screen):
-        """Slasher draw function."""
-        screen.blit(self.image, self.rect)
-        pygame.draw.rect(screen, "red",
-                        ((SCREEN_WIDTH // 2) - 512, 32, 1024, 64))
-        pygame.draw.rect(screen, "green",
-                        ((SCREEN_WIDTH // 2) - 512, 32, 1024*(self.hp / 2048), 64))
-
-def generate_map(map_size: int) -> List[List[str]]:
-    """Map generation function"""
+    def draw(self, screen, camera_x=0, camera_y=0):
+        """Scarecrow draw function."""
+        screen.blit(self.image, (self.rect.x - camera_x, self.rect.y - camera_y))
+        self.health.draw(screen, self.hp)
+
+class SpatialHash:
+    """Uniform grid broad phase answering which entities overlap a rect.
+
+    bounds returns the rect an entity is indexed by, its rect by default.
+    """
+    def __init__(self, cell_size: int = TILE_SIZE, bounds=attrgetter('rect')):
+        self.cell_size = cell_size
+        self.bounds = bounds
+        self.cells = defaultdict(set)
+        self.spans = {}
+
+    def _span(self, rect: pygame.Rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def _cells(self, span):
+        left, top, right, bottom = span
+        return [(x, y) for y in range(top, bottom + 1) for x in range(left, right + 1)]
+
+    def insert(self, entity) -> None:
+        """Start tracking an entity with a rect."""
+        span = self.spans[entity] = self._span(self.bounds(entity))
+        for cell in self._cells(span):
+            self.cells[cell].add(entity)
+
+    def remove(self, entity) -> None:
+        """Stop tracking an entity."""
+        for cell in self._cells(self.spans.pop(entity)):
+            self.cells[cell].discard(entity)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def move(self, entity) -> None:
+        """Refresh an entity's cells, only touching the grid when they changed."""
+        if self._span(self.bounds(entity)) != self.spans[entity]:
+            self.remove(entity)
+            self.insert(entity)
+
+    def query(self, rect: pygame.Rect) -> set:
+        """Entities overlapping rect."""
+        found = set()
+        for cell in self._cells(self._span(rect)):
+            found.update(self.cells.get(cell, ()))
+        return {entity for entity in found if rect.colliderect(self.bounds(entity))}
+
+def activation_region(enemy) -> pygame.Rect:
+    """Rect the player's center has to enter for enemy.enabled() to wake it up."""
+    return pygame.Rect(enemy.rect.centerx - 1.5*TILE_SIZE, enemy.rect.centery,
+                       3*TILE_SIZE + 1, TILE_SIZE + 1)
+
+class EnemyGroup(pygame.sprite.Group):
+    """Sprite group holding the enemies of a level, indexed by a SpatialHash.
+
+    Updates are scheduled by level of detail. Dormant enemies are indexed by
+    their activation region and only updated once the player enters it or
+    touches them. Awake enemies are updated every LOD_PERIODS[n] steps, n
+    being their distance from the player in screens, with the skipped time
+    added to their next update. Enemies touching the player are always
+    updated.
+    """
+    def __init__(self, *sprites):
+        self.grid = SpatialHash()
+        self.dormant = SpatialHash(bounds=activation_region)
+        self.awake = {}
+        self.order = {}
+        self.added = 0
+        self.steps = 0
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.grid.insert(sprite)
+        self.order[sprite] = self.added
+        self.added += 1
+        if sprite.enable:
+            self.awake[sprite] = 0.0
+        else:
+            self.dormant.insert(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.grid.remove(sprite)
+        self.order.pop(sprite)
+        if self.awake.pop(sprite, None) is None:
+            self.dormant.remove(sprite)
+
+    def period(self, enemy, player) -> int:
+        """Steps between two updates of an awake enemy."""
+        distance = max(abs(enemy.rect.centerx - player.rect.centerx) / SCREEN_WIDTH,
+                       abs(enemy.rect.centery - player.rect.centery) / SCREEN_HEIGHT)
+        return LOD_PERIODS[min(int(distance), len(LOD_PERIODS) - 1)]
+
+    def update(self, delta_time, tiles, player):  # pylint: disable=arguments-differ
+        """Update the enemies that are due, with their contact with the player."""
+        self.steps += 1
+        contacts = self.grid.query(player.rect)
+        awake = list(self.awake)
+        center = pygame.Rect(player.rect.center, (1, 1))
+        woken = self.dormant.query(center) | {enemy for enemy in contacts
+                                              if enemy not in self.awake}
+        for enemy in sorted(woken, key=self.order.get):
+            enemy.update(delta_time, tiles, player, enemy in contacts)
+            if enemy.enable:
+                self.dormant.remove(enemy)
+                self.awake[enemy] = 0.0
+
+        for enemy in awake:
+            elapsed = self.awake[enemy] + delta_time
+            period = self.period(enemy, player)
+            if period == 1 or enemy in contacts or (self.steps + self.order[enemy]) % period == 0:
+                enemy.update(elapsed, tiles, player, enemy in contacts)
+                self.grid.move(enemy)
+                elapsed = 0.0
+            self.awake[enemy] = elapsed
+
+    def hit(self, rect: pygame.Rect, damage: int) -> int:
+        """Damage every enemy overlapping rect and return how many were hit."""
+        hits = self.grid.query(rect)
+        for enemy in hits:
+            enemy.hp -= damage
+        return len(hits)
+
+    def reap(self) -> None:
+        """Remove dead enemies in one pass."""
+        dead = [enemy for enemy in self.sprites() if enemy.hp <= 0]
+        if dead:
+            self.remove(*dead)
+
+    def visible(self, viewport: pygame.Rect) -> list:
+        """Enemies overlapping the world-space viewport."""
+        return list(self.grid.query(viewport))
+
+    def remember(self) -> None:
+        """Store the enemy positions before a simulation step."""
+        for enemy in self.sprites():
+            enemy.previous = enemy.rect.topleft
+
+    def rects(self, viewport: pygame.Rect, alpha: float = 1.0) -> List[pygame.Rect]:
+        """Screen-space rects of the enemies inside the viewport, interpolated by alpha."""
+        rects = []
+        for enemy in self.visible(viewport):
+            camera_x, camera_y = interpolated_camera(enemy, viewport.x, viewport.y, alpha)
+            rects.append(enemy.rect.move(-camera_x, -camera_y))
+        return rects
+
+    def draw(self, screen: pygame.Surface, viewport: pygame.Rect, alpha: float = 1.0) -> None:
+        """Draw the enemies inside the viewport, interpolated by alpha."""
+        for enemy in self.visible(viewport):
+            enemy.draw(screen, *interpolated_camera(enemy, viewport.x, viewport.y, alpha))
+
+class EnemyStore:
+    """Array-backed Kamikazes and Slashers updated in batched NumPy passes.
+
+    Drop-in replacement for EnemyGroup, opt-in through spawn_enemies since
+    it steps every enemy on every update, without the dormant and LOD
+    skipping of EnemyGroup. Positions are the float top-left corners of the
+    enemy rects.
+    """
+    KINDS = (Kamikaze, Slasher)
+    SIZES = np.array([[32, 32], [64, 128]])
+    HP = np.array([128, 256])
+    SPEED = 2048
+
+    def __init__(self, specs: list, seed: int = None, rng=random):
+        self.kind = np.array([self.KINDS.index(kind) for kind, _, _ in specs], dtype=np.int8)
+        spawn = np.array([(x, y) for _, x, y in specs], dtype=float).reshape(-1, 2)
+        self.size = self.SIZES[self.kind]
+        self.pos = spawn - self.size * [0.5, 0.0]
+        self.pos[self.kind == 1, 1] -= self.size[self.kind == 1, 1]
+        self.vel = np.zeros_like(self.pos)
+        self.previous = self.pos.copy()
+        self.hp = self.HP[self.kind].copy()
+        self.enable = np.zeros(len(specs), dtype=bool)
+        self.rng = np.random.default_rng(rng.getrandbits(64) if seed is None else seed)
+        self.images = [ASSETS.image(name, (int(w), int(h)), RED)
+                       for name, (w, h) in zip(['kamikaze', 'slasher'], self.SIZES)]
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def _overlaps(self, rect: pygame.Rect) -> np.ndarray:
+        return ((self.pos[:, 0] < rect.right) & (self.pos[:, 0] + self.size[:, 0] > rect.left) &
+                (self.pos[:, 1] < rect.bottom) & (self.pos[:, 1] + self.size[:, 1] > rect.top))
+
+    def _in_range(self, player) -> np.ndarray:
+        center = self.pos + self.size // 2
+        d_x = player.rect.centerx - center[:, 0]
+        d_y = player.rect.centery - center[:, 1]
+        return (TILE_SIZE >= d_y) & (d_y >= 0) & (np.abs(d_x) <= 1.5*TILE_SIZE)
+
+    def update(self, delta_time: float, tiles: TileGrid, player) -> None:
+        """Batched Kamikaze.update and Slasher.update for all enemies."""
+        kamikaze = self.kind == 0
+        touching = kamikaze & self._overlaps(player.rect)
+        player.hp -= int(self.hp[touching].sum())
+        self.hp[touching] = 0
+
+        in_range = self._in_range(player)
+        moving = self.enable.copy()
+        self.enable |= in_range
+        self._move_kamikazes(np.flatnonzero(moving & kamikaze), in_range, delta_time, tiles,
+                             player)
+
+        slasher = np.flatnonzero(self.kind == 1)
+        jump = slasher[moving[slasher] & (self.rng.random(len(slasher)) < 0.025)]
+        self.pos[jump] = np.array(player.rect.center) - self.size[jump] // 2
+        attack = slasher[self.rng.random(len(slasher)) < 0.025]
+        player.hp -= 128 * int(self._overlaps(player.rect)[attack].sum())
+
+    def _move_kamikazes(self, index, in_range, delta_time, tiles, player) -> None:
+        if not len(index):
+            return
+        center = self.pos[index] + self.size[index] // 2
+        chase = np.stack([(player.rect.centerx - center[:, 0]) / SCREEN_WIDTH,
+                          (player.rect.centery - center[:, 1]) / SCREEN_HEIGHT], axis=1)
+        with PROFILER.section('pathfinding'):
+            step_row, step_col = tiles.pathfinder.directions(
+                tiles.tile_at(player.rect.centerx, player.rect.centery))
+        row = np.clip(center[:, 1] // TILE_SIZE, 0, tiles.rows - 1).astype(int)
+        col = np.clip(center[:, 0] // TILE_SIZE, 0, tiles.cols - 1).astype(int)
+        follow = np.stack([step_col[row, col], step_row[row, col]], axis=1)
+        self.vel[index] = np.where(in_range[index, None], chase, follow) * self.SPEED
+
+        for axis in (0, 1):
+            self.pos[index, axis] += self.vel[index, axis] * delta_time
+            with PROFILER.section('collisions'):
+                self._collisions(index, axis, tiles)
+
+    def _collisions(self, index, axis, tiles) -> None:
+        half = TILE_SIZE // 2
+        for corner_y, corner_x in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+            low = self.pos[index]
+            high = low + self.size[index]
+            row = ((high[:, 1] - 1) if corner_y else low[:, 1]) // TILE_SIZE
+            col = ((high[:, 0] - 1) if corner_x else low[:, 0]) // TILE_SIZE
+            inside = (row >= 0) & (row < tiles.rows) & (col >= 0) & (col < tiles.cols)
+            hit = inside.copy()
+            hit[inside] = tiles.solid[row[inside].astype(int), col[inside].astype(int)]
+            tile_low = (row if axis else col) * TILE_SIZE
+            push_back = hit & (high[:, axis] - tile_low < half)
+            push_on = hit & ~push_back & (low[:, axis] - (tile_low + TILE_SIZE) > -half)
+            self.pos[index[push_back], axis] = (tile_low - self.size[index, axis])[push_back]
+            self.pos[index[push_on], axis] = tile_low[push_on] + TILE_SIZE
+            self.vel[index[push_back | push_on], axis] = 0
+
+    def hit(self, rect: pygame.Rect, damage: int) -> int:
+        """Damage every enemy overlapping rect and return how many were hit."""
+        hits = self._overlaps(rect)
+        self.hp[hits] -= damage
+        return int(hits.sum())
+
+    def reap(self) -> None:
+        """Drop dead enemies from the arrays."""
+        alive = self.hp > 0
+        if not alive.all():
+            for name in ['kind', 'size', 'pos', 'vel', 'previous', 'hp', 'enable']:
+                setattr(self, name, getattr(self, name)[alive])
+
+    def visible(self, viewport: pygame.Rect) -> np.ndarray:
+        """Indices of the enemies overlapping the world-space viewport."""
+        return np.flatnonzero(self._overlaps(viewport))
+
+    def remember(self) -> None:
+        """Store the enemy positions before a simulation step."""
+        self.previous = self.pos.copy()
+
+    def _drawn(self, visible: np.ndarray, alpha: float) -> list:
+        delta = self.pos[visible] - self.previous[visible]
+        delta[(np.abs(delta) > TILE_SIZE).any(axis=1)] = 0
+        return (self.pos[visible] - (1 - alpha) * delta).tolist()
+
+    def rects(self, viewport: pygame.Rect, alpha: float = 1.0) -> List[pygame.Rect]:
+        """Screen-space rects of the enemies inside the viewport, interpolated by alpha."""
+        visible = self.visible(viewport)
+        return [pygame.Rect(int(x) - viewport.x, int(y) - viewport.y, int(w), int(h))
+                for (x, y), (w, h) in zip(self._drawn(visible, alpha),
+                                          self.size[visible].tolist())]
+
+    def draw(self, screen: pygame.Surface, viewport: pygame.Rect, alpha: float = 1.0) -> None:
+        """Draw the enemies inside the viewport, interpolated by alpha."""
+        visible = self.visible(viewport)
+        screen.blits([(self.images[kind], (int(x) - viewport.x, int(y) - viewport.y))
+                      for kind, (x, y) in zip(self.kind[visible].tolist(),
+                                              self._drawn(visible, alpha))], False)
+
+def spawn_enemies(specs: list, rng=random, store: bool = False):
+    """Enemy container function rolling chances with rng, array-backed if store is set.
+
+    Rosters holding anything but Kamikazes and Slashers always get an EnemyGroup.
+    """
+    if store and all(kind in EnemyStore.KINDS for kind, _, _ in specs):
+        return EnemyStore(specs, rng=rng)
+    return EnemyGroup(kind(x, y, rng) for kind, x, y in specs)
+
+def floor_components(floor: np.ndarray) -> np.ndarray:
+    """Label the 4-connected components of a boolean floor grid, 0 for walls.
+
+    Horizontal floor runs are labeled with NumPy and runs touching vertically
+    are joined with a union-find, so the Python work grows with the number of
+    runs rather than the number of tiles.
+    """
+    starts = floor.copy()
+    starts[:, 1:] &= ~floor[:, :-1]
+    runs = np.cumsum(starts).reshape(floor.shape) * floor
+    touching = floor[:-1] & floor[1:]
+    pairs = np.unique(np.stack([runs[:-1][touching], runs[1:][touching]], axis=1), axis=0)
+
+    parent = list(range(int(runs.max()) + 1))
+
+    def find(run: int) -> int:
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    for upper, lower in pairs.tolist():
+        parent[find(upper)] = find(lower)
+    return np.array([find(run) for run in range(len(parent))])[runs]
+
+def generate_floor(map_size: int, rng: np.random.Generator) -> np.ndarray:
+    """Random floor grid of odd floor rows joined by climbs, True for floor."""
     size_1 = map_size - 1
     size_5 = map_size // 5
-
-    def generate_layout() -> List[List[str]]:
-        layout = [['#' if i % 2 == 0 or j in {0, size_1} or i in {0, size_1} else ' '
-                   for j in range(map_size)] for i in range(map_size)]
-
-        for i in range(1, size_1):
-            if i % 2 == 0:
-                rand_range = random.randrange(1, size_5)
-                for _ in range(rand_range):
-                    clime = random.randrange(1, size_1)
-                    if layout[i - 1][clime] == ' ':
-                        layout[i][clime] = ' '
-            else:
-                ml, mr = sorted(random.randrange(size_5 * 2, size_5 * 3) for _ in range(2))
-                for j in list(range(random.randrange(1, size_5))) + \
-                        list(range(random.randrange(size_5 * 4, map_size), size_1)) + \
-                        list(range(ml, mr)):
-                    if layout[i - 1][j] == '#':
-                        layout[i][j] = '#'
-
-        return layout
-
-    def validate_layout(layout: List[List[str]]) -> bool:
-        visited = set()
-        start = next((i, j) for i in range(map_size)
-                    for j in range(map_size) if layout[i][j] == ' ')
-
-        stack = [start]
-        while stack:
-            i, j = stack.pop()
-            if (i, j) not in visited:
-                visited.add((i, j))
-                for di, dj in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    ni, nj = i + di, j + dj
-                    if 0 <= ni < map_size and 0 <= nj < map_size and layout[ni][nj] == ' ':
-                        stack.append((ni, nj))
-
-        return all(layout[i][j] != ' ' or (i, j) in visited
-                    for i in range(map_size) for j in range(map_size))
-
-    layout = generate_layout()
-    while not validate_layout(layout):
-        layout = generate_layout()
+    floor = np.zeros((map_size, map_size), dtype=bool)
+    floor[1:size_1:2, 1:size_1] = True
+    walls = np.zeros(map_size, dtype=bool)
 
     for i in range(1, size_1):
+        if i % 2 == 0:
+            climes = rng.integers(1, size_1, rng.integers(1, size_5))
+            floor[i, climes[floor[i - 1, climes]]] = True
+        else:
+            ml, mr = np.sort(rng.integers(size_5 * 2, size_5 * 3, 2))
+            walls[:] = False
+            walls[:rng.integers(1, size_5)] = True
+            walls[rng.integers(size_5 * 4, map_size):size_1] = True
+            walls[ml:mr] = True
+            floor[i] &= ~(walls & ~floor[i - 1])
+
+    return floor
+
+def repair_floor(floor: np.ndarray, rng: np.random.Generator) -> None:
+    """Connect every floor component in place, opening as few tiles as it needs."""
+    size_1 = len(floor) - 1
+    labels = floor_components(floor)
+    parent = {int(label): int(label) for label in np.unique(labels[floor])}
+
+    def union(a: int, b: int) -> bool:
+        while parent[a] != a:
+            a = parent[a]
+        while parent[b] != b:
+            b = parent[b]
+        parent[a] = b
+        return a != b
+
+    rows, cols = np.nonzero(~floor[2:size_1 - 1] & floor[1:size_1 - 2] & floor[3:size_1]
+                            & (labels[1:size_1 - 2] != labels[3:size_1]))
+    for k in rng.permutation(len(rows)).tolist():
+        i, j = int(rows[k]) + 2, int(cols[k])
+        if union(int(labels[i - 1, j]), int(labels[i + 1, j])):
+            floor[i, j] = True
+
+    for i in range(1, size_1, 2):
+        row = np.flatnonzero(floor[i])
+        for left, right in zip(row[:-1].tolist(), row[1:].tolist()):
+            if right - left > 1 and union(int(labels[i, left]), int(labels[i, right])):
+                floor[i, left + 1:right] = True
+
+def generate_map(map_size: int, seed: int = None) -> List[List[str]]:
+    """Map generation function, reproducible for a given seed.
+
+    Without a seed one is drawn from the random module, so seeding random
+    still reproduces the whole game.
+    """
+    rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+    floor = generate_floor(map_size, rng)
+    if len(np.unique(floor_components(floor)[floor])) > 1:
+        repair_floor(floor, rng)
+
+    layout = np.where(floor, ' ', '#').tolist()
+    for i in range(1, map_size - 1):
         if layout[1][i] == ' ':
             layout[1][i] = 'E'
             break
 
     return layout
 
+def idle_screen(screen: pygame.Surface, blits: list, buttons: list = (),
+                escape: bool = True):
+    """Show a static screen, sleeping on the event queue until it is left.
+
+    The screen is drawn once and only redrawn when the window is exposed.
+    Returns the value paired with a clicked button rect, or None on quit or
+    escape.
+    """
+    pygame.time.set_timer(pygame.USEREVENT, 0)
+    redraw = True
+    while True:
+        if redraw:
+            screen.fill(BLACK)
+            screen.blits(blits, False)
+            pygame.display.update()
+        event = pygame.event.wait()
+        if event.type == QUIT or escape and event.type == KEYDOWN and event.key == K_ESCAPE:
+            return None
+        if event.type == MOUSEBUTTONDOWN:
+            for rect, value in buttons:
+                if rect.collidepoint(event.pos):
+                    return value
+        redraw = event.type in (VIDEOEXPOSE, WINDOWEXPOSED)
+
 def main_menu(screen: pygame.Surface) -> bool:
     """Main menu function."""
-    font = pygame.font.Font(None, 128)
-    play_text = font.render('Play', True, WHITE)
-    quit_text = font.render('Quit', True, WHITE)
+    play_text = ASSETS.text('Play')
+    quit_text = ASSETS.text('Quit')
     play_rect = pygame.Rect(SCREEN_WIDTH // 2 - play_text.get_width() // 2,
     SCREEN_HEIGHT // 2 - play_text.get_height(), play_text.get_width(), play_text.get_height())
     quit_rect = pygame.Rect(SCREEN_WIDTH // 2 - quit_text.get_width() // 2,
     SCREEN_HEIGHT // 2 + quit_text.get_height(), quit_text.get_width(), quit_text.get_height())
 
-    while True:
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                return True
-            if event.type == MOUSEBUTTONDOWN:
-                if play_rect.collidepoint(pygame.mouse.get_pos()):
-                    return False
-                if quit_rect.collidepoint(pygame.mouse.get_pos()):
-                    return True
-
-        screen.fill(BLACK)
-        screen.blit(play_text, play_rect)
-        screen.blit(quit_text, quit_rect)
-        pygame.display.update()
+    return idle_screen(screen, [(play_text, play_rect), (quit_text, quit_rect)],
+                       [(play_rect, False), (quit_rect, True)], escape=False) is not False
 
 def score(screen: pygame.Surface, start_time: int, hp: int) -> None:
     """Score function."""
-    font = pygame.font.Font(None, 128)
     time = (pygame.time.get_ticks() - start_time) / 1000
     minute = math.floor(time / 60)
     second = math.floor(time) % 60
-    score_text = font.render('Time: ' + str(minute) + ':' + str(second), True, WHITE)
-    codebreaker_text = font.render('Achivement: Codebreaker', True, WHITE)
-    one_hit_text = font.render('Achivement: One Hit', True, WHITE)
+    score_text = ASSETS.text('Time: ' + str(minute) + ':' + str(second))
+    codebreaker_text = ASSETS.text('Achivement: Codebreaker')
+    one_hit_text = ASSETS.text('Achivement: One Hit')
     score_rect = pygame.Rect(SCREEN_WIDTH // 2 - score_text.get_width() // 2,
                                 SCREEN_HEIGHT // 2 - score_text.get_height(),
                                 score_text.get_width(), score_text.get_height())
@@ -455,245 +1271,560 @@ def score(screen: pygame.Surface, start_time: int, hp: int) -> None:
     one_hit_rect = pygame.Rect(SCREEN_WIDTH // 2 - one_hit_text.get_width() // 2,
                                 SCREEN_HEIGHT // 2 + 2 * one_hit_text.get_height(),
                                 one_hit_text.get_width(), one_hit_text.get_height())
-
-    while True:
-        keys = pygame.key.get_pressed()
-        if keys[K_ESCAPE]:
-            return None
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                return None
-
-        screen.fill(BLACK)
-        screen.blit(score_text, score_rect)
-        if time <= 60:
-            screen.blit(codebreaker_text, codebreaker_rect)
-        if hp <= 128:
-            screen.blit(one_hit_text, one_hit_rect)
-        pygame.display.update()
-
-def game_over(screen: pygame.Surface, level: bool) -> None:
-    """Game over function."""
-    font = pygame.font.Font(None, 128)
-    over_text = font.render('Game Over', True, WHITE)
+    awarded = score_achievements(time, hp)
+    blits = [(score_text, score_rect)]
+    if 'Codebreaker' in awarded:
+        blits.append((codebreaker_text, codebreaker_rect))
+    if 'One Hit' in awarded:
+        blits.append((one_hit_text, one_hit_rect))
+    idle_screen(screen, blits)
+
+def score_achievements(time: float, hp: int) -> List[str]:
+    """Achievements awarded on the score screen."""
+    awarded = []
+    if time <= 60:
+        awarded.append('Codebreaker')
+    if hp <= 128:
+        awarded.append('One Hit')
+    return awarded
+
+def game_over(screen: pygame.Surface, level: bool, attacked: bool) -> None:
+    """Game over function, attacked tells whether the player ever attacked."""
+    over_text = ASSETS.text('Game Over')
     over_rect = pygame.Rect(SCREEN_WIDTH // 2 - over_text.get_width() // 2,
     SCREEN_HEIGHT // 2 - over_text.get_height(), over_text.get_width(), over_text.get_height())
-    pacifist_text = font.render('Achivement: Pacifist', True, WHITE)
+    pacifist_text = ASSETS.text('Achivement: Pacifist')
     pacifist_rect = pygame.Rect(SCREEN_WIDTH // 2 - pacifist_text.get_width() // 2,
     SCREEN_HEIGHT // 2 + pacifist_text.get_height(),
     pacifist_text.get_width(), pacifist_text.get_height())
-
-    while True:
-        keys = pygame.key.get_pressed()
-        if keys[K_ESCAPE]:
-            return None
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                return None
-
-        global ATTACK
-        screen.fill(BLACK)
-        screen.blit(over_text, over_rect)
-        if ATTACK is False and level is True:
-            screen.blit(pacifist_text, pacifist_rect)
-        pygame.display.update()
-
-def level(screen: pygame.Surface, scene_id: int) -> None:
+    awarded = game_over_achievements(level, attacked)
+    blits = [(over_text, over_rect)]
+    if 'Pacifist' in awarded:
+        blits.append((pacifist_text, pacifist_rect))
+    idle_screen(screen, blits)
+
+def game_over_achievements(level: bool, attack: bool) -> List[str]:
+    """Achievements awarded on the game over screen."""
+    return ['Pacifist'] if attack is False and level is True else []
+
+class Session:
+    """State of an interactive session kept across levels and runs."""
+    def __init__(self):
+        self.attacked = False
+
+class FixedStep:
+    """Turns variable frame times into a whole number of fixed simulation steps.
+
+    alpha is the fraction of a step left over after the last advance(), used
+    to draw entities between their last two simulated positions. At most
+    max_steps are run per frame, time beyond that is dropped so a slow frame
+    cannot snowball into slower ones.
+    """
+    def __init__(self, step_ms: int = SIM_STEP_MS, max_steps: int = MAX_STEPS):
+        self.step_ms = step_ms
+        self.max_steps = max_steps
+        self.accumulator = 0
+
+    def advance(self, elapsed_ms: int) -> int:
+        """Add the time of a frame and return how many steps to simulate."""
+        self.accumulator = min(self.accumulator + elapsed_ms, self.step_ms * self.max_steps)
+        steps = self.accumulator // self.step_ms
+        self.accumulator -= steps * self.step_ms
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        """Fraction of a step between the last simulated state and now."""
+        return self.accumulator / self.step_ms
+
+def level(screen: pygame.Surface, scene_id: int, loader=None, session=None) -> None:
     """Level function."""
+    session = session or Session()
     clock = pygame.time.Clock()
+    steps = FixedStep()
     pygame.time.set_timer(pygame.USEREVENT, 1000)
-    layout = generate_map(MAP_SIZE)
-    player = create_player(layout)
-    enemies = create_enemy(layout, scene_id)
-
-    while handle_events(True, player, enemies):
-        camera_x, camera_y = update_camera(player, layout, screen)
-        entity_update(clock.get_time() / 1000, layout, player, enemies)
-        update_positions(enemies, camera_x, camera_y, player)
-
-        for enemy in enemies:
-            if enemy.hp <= 0:
-                enemies.remove(enemy)
-
-        if player.hp <= 0:
-            game_over(screen, False)
-            return 0
+    plan = loader.take(scene_id) if loader else plan_level(scene_id)
+    if loader:
+        loader.prefetch(scene_id + 1)
+    layout, tiles = plan.layout, plan.tiles
+    view = LevelView(layout)
+    player = Player(*plan.spawn)
+    enemies = spawn_enemies(plan.enemies)
 
-        draw(screen, layout, enemies, player, camera_x, camera_y, True)
-        reset_positions(enemies, camera_x, camera_y, player)
-        if next_level(layout, player, camera_x, camera_y):
-            return (scene_id + 1)
-        pygame.display.update()
-        clock.tick(60)
-    return 0
-
-def boss(screen: pygame.Surface) -> int:
+    while True:
+        for _ in range(steps.advance(clock.tick(MAX_FPS))):
+            remember_positions(player, enemies)
+            if not handle_events(True, player, enemies, SIM_STEP_MS):
+                return 0
+            entity_update(SIM_STEP_MS / 1000, tiles, player, enemies)
+            enemies.reap()
+            session.attacked = session.attacked or player.attacked
+
+            if player.hp <= 0:
+                game_over(screen, False, session.attacked)
+                return 0
+            if next_level(tiles, player):
+                return (scene_id + 1)
+
+        camera_x, camera_y = update_camera(player, layout, screen, steps.alpha)
+        update_display(screen, draw(screen, view, enemies, player, camera_x, camera_y, True,
+                                    steps.alpha))
+
+def boss(screen: pygame.Surface, session=None) -> int:
     """Boss Level function."""
+    session = session or Session()
     clock = pygame.time.Clock()
+    steps = FixedStep()
     pygame.time.set_timer(pygame.USEREVENT, 1000)
-    layout = [['#', '#', '#', '#', '#', '#', '#', '#'],
-                ['#', ' ', ' ', ' ', ' ', ' ', ' ', '#'],
-                ['#', ' ', ' ', ' ', ' ', ' ', ' ', '#'],
-                ['#', ' ', ' ', ' ', ' ', ' ', ' ', '#'],
-                ['#', '#', '#', '#', '#', '#', '#', '#']]
-    player = Player(TILE_SIZE + TILE_SIZE // 2, 4*TILE_SIZE)
-    enemy = Scarecrow(6*TILE_SIZE + TILE_SIZE // 2, 4*TILE_SIZE)
+    layout = BOSS_LAYOUT
+    tiles = TileGrid(layout)
+    view = ArenaView(layout)
+    player, enemy = create_boss()
     camera_x, camera_y = 0, 40
 
-    while handle_events(False, player, enemy):
-        entity_update(clock.get_time() / 1000, layout, player, enemy)
+    while True:
+        for _ in range(steps.advance(clock.tick(MAX_FPS))):
+            remember_positions(player, enemy)
+            if not handle_events(False, player, enemy, SIM_STEP_MS):
+                return None
+            entity_update(SIM_STEP_MS / 1000, tiles, player, enemy)
+            session.attacked = session.attacked or player.attacked
 
-        if enemy.hp <= 0:
-            del enemy
-            return player.hp
+            if enemy.hp <= 0:
+                del enemy
+                return player.hp
 
-        if player.hp <= 0:
-            game_over(screen, True)
-            return None
+            if player.hp <= 0:
+                game_over(screen, True, session.attacked)
+                return None
 
-        draw(screen, layout, enemy, player, camera_x, camera_y, False)
-        pygame.display.update()
-        clock.tick(60)
+        update_display(screen, draw(screen, view, enemy, player, camera_x, camera_y, False,
+                                    steps.alpha))
 
 def create_player(layout: List[List[str]]):
     """Player creation function."""
+    spawn = player_spawn(layout)
+    return Player(*spawn) if spawn else None
+
+def player_spawn(layout: List[List[str]]):
+    """Player spawn position function."""
     for i in range(1, MAP_SIZE - 2):
         if layout[MAP_SIZE - 2][i] == ' ':
-            return Player(i*TILE_SIZE + TILE_SIZE // 2, (MAP_SIZE - 1)*TILE_SIZE)
+            return i*TILE_SIZE + TILE_SIZE // 2, (MAP_SIZE - 1)*TILE_SIZE
     return None
 
+def create_boss(rng=random):
+    """Boss arena player and Scarecrow creation function."""
+    return (Player(TILE_SIZE + TILE_SIZE // 2, 4*TILE_SIZE),
+            Scarecrow(6*TILE_SIZE + TILE_SIZE // 2, 4*TILE_SIZE, rng))
+
 def create_enemy(layout: List[List[str]], scene_id: int):
     """Enemy creation function."""
-    enemy = pygame.sprite.Group()
+    return spawn_enemies(plan_enemies(layout, scene_id))
+
+def plan_enemies(layout: List[List[str]], scene_id: int, rng=random, count: int = None) -> list:
+    """Enemy roster function, returns count (class, x, y) spawns, 9 to 12 by default."""
+    enemy = []
     size_1 = MAP_SIZE - 1
 
-    for _ in range(random.randrange(9, 13)):
+    for _ in range(rng.randrange(9, 13) if count is None else count):
         while True:
-            i, j = random.randrange(1, size_1), random.randrange(1, size_1, 2)
+            i, j = rng.randrange(1, size_1), rng.randrange(1, size_1, 2)
             if layout[i][j] == ' ' and (layout[i + 1][j] == '#' or layout[i - 1][j] == '#'):
                 if scene_id == 1:
-                    enemy.add(Kamikaze(j*TILE_SIZE + random.randint(16, TILE_SIZE - 16),
-                                        i*TILE_SIZE))
+                    enemy.append((Kamikaze, j*TILE_SIZE + rng.randint(16, TILE_SIZE - 16),
+                                  i*TILE_SIZE))
                 elif scene_id == 2:
-                    enemy.add(Slasher(j*TILE_SIZE + random.randint(32, TILE_SIZE - 32),
-                                        (i + 1)*TILE_SIZE))
+                    enemy.append((Slasher, j*TILE_SIZE + rng.randint(32, TILE_SIZE - 32),
+                                  (i + 1)*TILE_SIZE))
                 elif scene_id == 3:
-                    enemy.add(random.choice([Kamikaze(j*TILE_SIZE + \
-                                            random.randint(16, TILE_SIZE - 16), i*TILE_SIZE),
-                                            Slasher(j*TILE_SIZE + \
-                                            random.randint(32, TILE_SIZE - 32), (i + 1)*TILE_SIZE)]))
+                    enemy.append(rng.choice([(Kamikaze, j*TILE_SIZE + \
+                                             rng.randint(16, TILE_SIZE - 16), i*TILE_SIZE),
+                                             (Slasher, j*TILE_SIZE + \
+                                             rng.randint(32, TILE_SIZE - 32), (i + 1)*TILE_SIZE)]))
                 break
 
     return enemy
 
-def handle_events(iterable: bool, player, enemy) -> bool:
-    """Events handling function."""
+def plan_level(scene_id: int, seed: int = None, enemies: int = None) -> LevelPlan:
+    """Level plan function with an optional roster size, safe to run off the main thread."""
+    rng = random.Random(random.getrandbits(64) if seed is None else seed)
+    layout = generate_map(MAP_SIZE, rng.getrandbits(64))
+    return LevelPlan(scene_id, layout, TileGrid(layout), player_spawn(layout),
+                     plan_enemies(layout, scene_id, rng, enemies))
+
+LEVEL_ENEMIES = (Kamikaze, Slasher, Scarecrow)
+
+def bake_level(plan: LevelPlan) -> levelformat.Level:
+    """Convert a level plan to the level library format."""
+    tiles = levelformat.encode_layout(plan.layout)
+    exits = np.argwhere(tiles == levelformat.TILE_CODES.index('E'))
+    enemies = np.array([(LEVEL_ENEMIES.index(kind), x, y) for kind, x, y in plan.enemies],
+                       dtype=levelformat.ENEMY)
+    return levelformat.Level(plan.scene_id, tiles, plan.tiles.solid, plan.spawn,
+                             tuple(exits[0].tolist()) if len(exits) else None, enemies)
+
+def load_level(level: levelformat.Level) -> LevelPlan:
+    """Level plan of a level read from a library."""
+    layout = levelformat.decode_layout(level.tiles)
+    return LevelPlan(level.scene_id, layout, TileGrid(layout, level.solid), level.spawn,
+                     [(LEVEL_ENEMIES[kind], x, y) for kind, x, y in level.enemies.tolist()])
+
+class LevelLoader:
+    """Builds upcoming level plans in a background thread.
+
+    Level seeds are drawn from the random module when a plan is requested, so
+    a threaded and an unthreaded loader produce the same levels. With a level
+    library, scenes it holds levels for are picked from it by the seed instead
+    of being generated. When the enemies argument is set, generated levels
+    get that many enemies each. Seeds are drawn from rng, the random module
+    by default.
+    """
+    def __init__(self, threaded: bool = True, library: levelformat.LevelLibrary = None,
+                 enemies: int = None, rng=random):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='level-loader') \
+            if threaded else None
+        self.library = library
+        self.enemies = enemies
+        self.rng = rng
+        self._pending = {}
+
+    def _plan(self, scene_id: int, seed: int = None) -> LevelPlan:
+        seed = self.rng.getrandbits(64) if seed is None else seed
+        levels = self.library.scenes(scene_id) if self.library else []
+        if not levels:
+            return plan_level(scene_id, seed, self.enemies)
+        return load_level(self.library[random.Random(seed).choice(levels)])
+
+    def prefetch(self, scene_id: int) -> None:
+        """Start building a level plan unless one is already on its way."""
+        if 1 <= scene_id <= 3 and scene_id not in self._pending:
+            seed = self.rng.getrandbits(64)
+            self._pending[scene_id] = self._executor.submit(self._plan, scene_id, seed) \
+                if self._executor else seed
+
+    def take(self, scene_id: int) -> LevelPlan:
+        """Hand over a prefetched plan, building it now if it was never requested."""
+        pending = self._pending.pop(scene_id, None)
+        if pending is None:
+            return self._plan(scene_id)
+        return pending.result() if self._executor else self._plan(scene_id, pending)
+
+    def clear(self) -> None:
+        """Forget every requested plan, so a new run does not reuse the levels of the last one."""
+        for pending in self._pending.values():
+            if self._executor:
+                pending.cancel()
+        self._pending.clear()
+
+    def shutdown(self) -> None:
+        """Stop the background thread."""
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+class InputLog:
+    """Compact binary log of the seed and per-frame input of one run.
+
+    Every frame takes four bytes: the frame time in milliseconds, a flags byte
+    with the move direction, quit and HP drain ticks, and a byte with the jump
+    and attack counts. Frames are buffered and written by the IO thread.
+    """
+    MAGIC = b'GIN1'
+    HEADER = struct.Struct('<4sQ')
+    FRAME = struct.Struct('<HBB')
+    BUFFER = 4096
+
+    def __init__(self, path: str, seed: int):
+        self.seed = seed
+        self.file = open(path, 'wb')  # pylint: disable=consider-using-with
+        self.buffer = bytearray(self.HEADER.pack(self.MAGIC, seed))
+
+    def write(self, delta_ms: int, frame: FrameInput) -> None:
+        """Append one frame."""
+        flags = (frame.move == -1) | (frame.move == 1) << 1 | frame.quit << 2 | \
+            min(frame.drains, 31) << 3
+        self.buffer += self.FRAME.pack(min(delta_ms, 0xFFFF), flags,
+                                       min(frame.jumps, 15) | min(frame.attacks, 15) << 4)
+        if len(self.buffer) >= self.BUFFER:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the buffered frames to the IO thread."""
+        IO.submit(self.file.write, bytes(self.buffer))
+        self.buffer.clear()
+
+    def close(self) -> None:
+        """Flush and close the log, waiting for the IO thread."""
+        self.flush()
+        IO.submit(self.file.close).result()
+
+    @classmethod
+    def read(cls, path: str):
+        """Return the seed and the (delta_time, FrameInput) frames of a log."""
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, seed = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError(path + ' is not an input log')
+        frames = []
+        for delta_ms, flags, counts in cls.FRAME.iter_unpack(data[cls.HEADER.size:]):
+            frames.append((delta_ms / 1000,
+                           FrameInput((flags & 2) // 2 - (flags & 1), counts & 15, counts >> 4,
+                                      flags >> 3, bool(flags & 4))))
+        return seed, frames
+
+def handle_events(iterable: bool, player, enemy, delta_ms: int = 0) -> bool:
+    """Events handling function, delta_ms is the frame time that will be recorded."""
+    with PROFILER.section('handle_events'):
+        frame = read_input()
+        if RECORDER:
+            RECORDER.write(delta_ms, frame)
+        return apply_input(frame, iterable, player, enemy)
+
+def read_input() -> FrameInput:
+    """Collect the keyboard, mouse and timer input of one frame."""
     keys = pygame.key.get_pressed()
-    player.move(-1 if keys[K_a] and not keys[K_d] else
-                 1 if keys[K_d] and not keys[K_a] else 0)
+    jumps = attacks = drains = 0
 
     for event in pygame.event.get():
         if (event.type == QUIT or
             (event.type == KEYUP and event.key == K_ESCAPE)):
-            return False
+            return FrameInput(quit=True)
         if event.type == pygame.USEREVENT:
-            player.hp -= 16
+            drains += 1
+        if event.type == KEYUP and event.key == K_F3:
+            PROFILER.toggle_overlay()
         if event.type == KEYUP and event.key == K_SPACE:
-            player.jump()
+            jumps += 1
         elif event.type == MOUSEBUTTONDOWN:
-            player.attack(enemy, iterable)
-
+            attacks += 1
+
+    return FrameInput(-1 if keys[K_a] and not keys[K_d] else
+                      1 if keys[K_d] and not keys[K_a] else 0,
+                      jumps, attacks, drains)
+
+def apply_input(frame: FrameInput, iterable: bool, player, enemy) -> bool:
+    """Apply one frame of input to the player, False when the game should quit."""
+    if frame.quit:
+        return False
+    player.move(frame.move)
+    player.hp -= 16 * frame.drains
+    for _ in range(frame.jumps):
+        player.jump()
+    hits = 0
+    for _ in range(frame.attacks):
+        hits += player.attack(enemy, iterable)
+    if TELEMETRY.enabled:
+        if frame.drains:
+            TELEMETRY.emit('damage', source='drain', target='player', amount=16 * frame.drains)
+        if hits:
+            TELEMETRY.emit('damage', source='player', target='enemy', amount=128 * hits,
+                           hits=hits)
     return True
 
-def entity_update(delta_time: float, layout: List[List[str]], player, enemy) -> None:
-    """Update entity function."""
-    player.update(delta_time, layout)
-    enemy.update(delta_time, layout, player)
+def remember_positions(player, enemy) -> None:
+    """Store entity positions before a simulation step, for interpolated drawing."""
+    player.previous = player.rect.topleft
+    if isinstance(enemy, pygame.sprite.Sprite):
+        enemy.previous = enemy.rect.topleft
+    else:
+        enemy.remember()
+
+def interpolated_camera(entity, camera_x, camera_y, alpha: float):
+    """Camera offset drawing a sprite alpha of the way from its previous position.
 
-def update_camera(player, layout: List[List[str]], screen: pygame.Surface):
-    """Camera update function."""
-    camera_x = min(max(player.rect.centerx - screen.get_width() // 2, 0),
+    Moves longer than a tile are teleports and are not interpolated.
+    """
+    delta_x = entity.rect.x - entity.previous[0]
+    delta_y = entity.rect.y - entity.previous[1]
+    if abs(delta_x) > TILE_SIZE or abs(delta_y) > TILE_SIZE:
+        return camera_x, camera_y
+    return (camera_x + round((1 - alpha) * delta_x), camera_y + round((1 - alpha) * delta_y))
+
+def entity_update(delta_time: float, tiles: TileGrid, player, enemy) -> None:
+    """Update entity function."""
+    with PROFILER.section('entity_update'):
+        hp = player.hp
+        player.update(delta_time, tiles)
+        enemy.update(delta_time, tiles, player)
+    if TELEMETRY.enabled and player.hp < hp:
+        TELEMETRY.emit('damage', source='enemy', target='player', amount=hp - player.hp)
+
+def update_camera(player, layout: List[List[str]], screen: pygame.Surface, alpha: float = 1.0):
+    """Camera update function, following the player as drawn with alpha."""
+    shift_x, shift_y = interpolated_camera(player, 0, 0, alpha)
+    camera_x = min(max(player.rect.centerx - shift_x - screen.get_width() // 2, 0),
                     len(layout[0])*TILE_SIZE - screen.get_width())
-    camera_y = min(max(player.rect.centery - screen.get_height() // 2, 0),
+    camera_y = min(max(player.rect.centery - shift_y - screen.get_height() // 2, 0),
                     len(layout)*TILE_SIZE - screen.get_height())
 
     return camera_x, camera_y
 
-def draw(screen: pygame.Surface, layout: List[List[str]], enemies,
-            player, camera_x, camera_y, iterate: bool) -> None:
-    """Draw function."""
-    screen.fill(BLACK)
-    for y, row in enumerate(layout):
-        if y*TILE_SIZE - camera_y >= 0 or y*TILE_SIZE - camera_y <= SCREEN_WIDTH:
-            for x, tile in enumerate(row):
-                if (tile in ['#', 'E'] and (x*TILE_SIZE - camera_x >= 0 or \
-                    x*TILE_SIZE - camera_x <= SCREEN_HEIGHT)):
-                    tile_rect = pygame.Rect((x*TILE_SIZE - camera_x),
-                                            (y*TILE_SIZE - camera_y), TILE_SIZE, TILE_SIZE)
-                    pygame.draw.rect(screen, WHITE if tile == '#' else YELLOW, tile_rect)
-
-    if iterate:
-        for enemy in enemies:
-            enemy.draw(screen)
-    else:
-        enemies.draw(screen)
-    player.draw(screen)
-
-def next_level(layout: List[List[str]], player, camera_x: int, camera_y: int) -> bool:
+def draw(screen: pygame.Surface, view: LevelView, enemies, player, camera_x, camera_y,
+         iterate: bool, alpha: float = 1.0) -> List[pygame.Rect]:
+    """Draw function, entities keep world coordinates and are drawn at the camera offset.
+
+    Entities are drawn alpha of the way from their previous to their current
+    position. HP bars are only pushed when their value changed. The profiler
+    overlay of the last frame is repainted, so hiding it leaves no trace.
+    Returns the screen rects to update.
+    """
+    with PROFILER.section('draw'):
+        viewport = screen.get_rect(topleft=(camera_x, camera_y))
+        player_x, player_y = interpolated_camera(player, camera_x, camera_y, alpha)
+        rects = [player.rect.move(-player_x, -player_y),
+                 player.sword_rect.move(-player_x, -player_y)]
+        if PROFILER.rect:
+            rects.append(PROFILER.rect)
+        if player.health.changed(player.hp):
+            rects.append(player.hp_bar)
+        if iterate:
+            rects += enemies.rects(viewport, alpha)
+        else:
+            enemy_x, enemy_y = interpolated_camera(enemies, camera_x, camera_y, alpha)
+            rects.append(enemies.rect.move(-enemy_x, -enemy_y))
+            if enemies.health.changed(enemies.hp):
+                rects.append(enemies.hp_bar)
+        dirty = view.refresh(screen, camera_x, camera_y, rects)
+
+        if iterate:
+            enemies.draw(screen, viewport, alpha)
+        else:
+            enemies.draw(screen, enemy_x, enemy_y)
+        player.draw(screen, player_x, player_y)
+    return dirty
+
+def update_display(screen: pygame.Surface, dirty: List[pygame.Rect]) -> None:
+    """Push the dirty rects and the profiler overlay to the display, closing the frame."""
+    overlay = PROFILER.draw(screen, ASSETS.font)
+    if overlay:
+        dirty.append(overlay)
+    with PROFILER.section('display_update'):
+        pygame.display.update(dirty)
+    PROFILER.end_frame()
+    if TELEMETRY.enabled:
+        TELEMETRY.frame(dirty=len(dirty))
+
+def next_level(tiles: TileGrid, player) -> bool:
     """Check for level exit."""
-    for y, row in enumerate(layout):
-        for x, tile in enumerate(row):
-            if tile == 'E':
-                tile_rect = pygame.Rect((x*TILE_SIZE - camera_x),
-                                        (y*TILE_SIZE) - camera_y, TILE_SIZE, TILE_SIZE)
-                if player.rect.colliderect(tile_rect):
-                    return True
-    return False
-
-def update_positions(enemies, camera_x: int, camera_y: int, player) -> None:
-    """Update position function."""
-    player.rect.centerx -= camera_x
-    player.rect.centery -= camera_y
-    player.sword_rect.centerx -= camera_x
-    player.sword_rect.centery -= camera_y
-    for enemy in enemies:
-        enemy.rect.centerx -= camera_x
-        enemy.rect.centery -= camera_y
-
-def reset_positions(enemies, camera_x: int, camera_y: int, player) -> None:
-    """Reset position function."""
-    player.rect.centerx += camera_x
-    player.rect.centery += camera_y
-    player.sword_rect.centerx += camera_x
-    player.sword_rect.centery += camera_y
-    for enemy in enemies:
-        enemy.rect.centerx += camera_x
-        enemy.rect.centery += camera_y
+    return bool(tiles.colliding(player.rect, 'E'))
 
 def init_game() -> pygame.Surface:
-    """Init pygame function."""
-    pygame.init()
+    """Init pygame function.
+
+    Only the display is initialized here. Fonts are initialized by ASSETS on
+    first use and audio only once a sound is played.
+    """
+    pygame.display.init()
+    pygame.time.Clock().tick()  # starts the SDL timer pygame.time.get_ticks() reads
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption('Game')
     return screen
 
-def main(scene_id: int = 0) -> None:
-    """Main function."""
+def startup_report(marks: list) -> str:
+    """Startup profile of (name, perf_counter) marks, timed from when main.py started running."""
+    lines = []
+    previous = STARTED
+    for name, clock in marks:
+        lines.append(format(name, '<12') + format((clock - previous) * 1000, '8.1f') + ' ms')
+        previous = clock
+    lines.append(format('first frame', '<12') + format((previous - STARTED) * 1000, '8.1f') +
+                 ' ms total')
+    return '\n'.join(lines)
+
+def seed_run() -> int:
+    """Seed the random module for a new run and return the seed."""
+    seed = random.getrandbits(64)
+    random.seed(seed)
+    return seed
+
+def recording_path(path: str, seed: int) -> str:
+    """Input log path of the run with seed, path with the seed added to the file name."""
+    root, ext = os.path.splitext(path)
+    return root + '-' + format(seed, '016x') + ext
+
+def start_recording(path: str, seed: int) -> None:
+    """Record the input of the run seeded with seed to its recording_path()."""
+    global RECORDER
+    stop_recording()
+    RECORDER = InputLog(recording_path(path, seed), seed)
+
+def stop_recording() -> None:
+    """Close the input log of the current run, if any."""
+    global RECORDER
+    if RECORDER:
+        RECORDER.close()
+        RECORDER = None
+
+def start_telemetry(path: str) -> None:
+    """Record telemetry to path, filtered and sampled by GAME_TELEMETRY_LEVEL/_SAMPLE.
+
+    GAME_TELEMETRY_SAMPLE lists event=n pairs, e.g. 'path=16,frame=60'.
+    """
+    sample = os.environ.get('GAME_TELEMETRY_SAMPLE', '')
+    TELEMETRY.start(path, os.environ.get('GAME_TELEMETRY_LEVEL', 'info'),
+                    {event: int(every) for event, every in
+                     (pair.split('=') for pair in sample.split(',') if pair)})
+
+def main(scene_id: int = 0, profile_startup: bool = False) -> None:
+    """Main function.
+
+    With profile_startup, the game quits after drawing the first menu frame
+    and prints the startup_report().
+    """
+    ASSETS.preload(SPRITES)
+    if os.environ.get('GAME_TELEMETRY'):
+        start_telemetry(os.environ['GAME_TELEMETRY'])
     screen = init_game()
+    marks = [('imports', IMPORTED), ('display', perf_counter())]
+    levels = os.environ.get('GAME_LEVELS')
+    loader = LevelLoader(library=levelformat.LevelLibrary(levels) if levels else None)
+    session = Session()
 
-    while True:
-        if scene_id == 0:
-            start_time = pygame.time.get_ticks()
-            if main_menu(screen):
-                return None
-            scene_id = 1
-        elif scene_id != 4:
-            scene_id = level(screen, scene_id)
-        else:
-            hp = boss(screen)
-            score(screen, start_time, hp)
-            scene_id = 0
+    try:
+        while True:
+            if scene_id == 0:
+                stop_recording()
+                loader.clear()
+                seed = seed_run()
+                loader.prefetch(1)
+                start_time = pygame.time.get_ticks()
+                if profile_startup:
+                    pygame.event.post(pygame.event.Event(QUIT))
+                if main_menu(screen):
+                    if profile_startup:
+                        print(startup_report(marks + [('menu', perf_counter())]))
+                    return None
+                if os.environ.get('GAME_RECORD'):
+                    start_recording(os.environ['GAME_RECORD'], seed)
+                scene_id = 1
+            elif scene_id != 4:
+                scene_id, finished = level(screen, scene_id, loader, session), scene_id
+                TELEMETRY.emit('level', scene=finished, next=scene_id)
+            else:
+                hp = boss(screen, session)
+                TELEMETRY.emit('level', scene=4, next=0, hp=hp)
+                score(screen, start_time, hp)
+                scene_id = 0
+    finally:
+        loader.shutdown()
+        ASSETS.shutdown()
+        stop_recording()
+        IO.shutdown(wait=True)
+        TELEMETRY.stop()
+        if os.environ.get('GAME_PROFILE'):
+            PROFILER.export(os.environ['GAME_PROFILE'])
+
+def main_cli() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print the time to the first frame and quit')
+    args = parser.parse_args()
+    try:
+        main(profile_startup=args.profile_startup)
+    finally:
+        pygame.quit()
 
 if __name__ == '__main__':
-    main()
-    pygame.quit()
+    main_cli()
@@ -0,0 +1,122 @@
+"""This module contains a low-overhead per-frame profiler."""
+import json
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Dict, List
+
+PERCENTILES = (50, 95, 99)
+
+class _Section:
+    """Timer accumulating the time spent in one named section during a frame."""
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        frame = self.profiler.frame
+        frame[self.name] = frame.get(self.name, 0.0) + time.perf_counter() - self.start
+
+class FrameProfiler:
+    """Frame profiler keeping rolling per-section timings.
+
+    Time spent inside profiler.section(name) blocks is summed per frame and
+    end_frame() stores the sums in a rolling window of the last frames. When
+    disabled, section() returns a shared no-op context manager.
+    """
+    def __init__(self, enabled: bool = False, window: int = 600):
+        self.enabled = enabled
+        self.window = window
+        self.overlay_visible = False
+        self.frame = {}
+        self.samples: Dict[str, deque] = {}
+        self.frames = 0
+        self._sections = {}
+        self._null = nullcontext()
+        self._frame_start = time.perf_counter()
+        self._overlay = None
+        self.rect = None
+
+    def section(self, name: str):
+        """Context manager timing a block as part of the named section."""
+        if not self.enabled:
+            return self._null
+        section = self._sections.get(name)
+        if section is None:
+            section = self._sections[name] = _Section(self, name)
+        return section
+
+    def end_frame(self) -> None:
+        """Close the current frame and add its section totals to the window."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.frame['frame'] = now - self._frame_start
+        self._frame_start = now
+        for name, seconds in self.frame.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(seconds)
+        self.frame = {}
+        self.frames += 1
+
+    def percentiles(self, name: str) -> Dict[str, float]:
+        """Rolling percentiles of a section in milliseconds."""
+        samples = sorted(self.samples.get(name, ()))
+        if not samples:
+            return {}
+        return {'p' + str(p): samples[min(len(samples) - 1, len(samples) * p // 100)] * 1000
+                for p in PERCENTILES}
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Percentiles of every section."""
+        return {name: self.percentiles(name) for name in sorted(self.samples)}
+
+    def export(self, path: str) -> None:
+        """Write the report as JSON with stable ordering, to diff between builds."""
+        report = {name: {key: round(value, 3) for key, value in values.items()}
+                  for name, values in self.report().items()}
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'frames': self.frames, 'window': self.window, 'sections': report},
+                      file, indent=2, sort_keys=True)
+            file.write('\n')
+
+    def lines(self) -> List[str]:
+        """Report lines shown by the overlay."""
+        lines = []
+        for name, values in self.report().items():
+            lines.append(name.ljust(16) + ' '.join(key + ' ' + format(value, '6.2f')
+                                                   for key, value in values.items()))
+        return lines
+
+    def toggle_overlay(self) -> None:
+        """Show or hide the overlay, enabling profiling when shown."""
+        self.overlay_visible = not self.overlay_visible
+        self.enabled = self.enabled or self.overlay_visible
+
+    def draw(self, screen, font, refresh: int = 30):
+        """Draw the overlay in the top left corner and return its rect, if visible.
+
+        rect keeps the screen rect of the overlay drawn last and is None once
+        it is hidden, so callers can repaint the area it covered. font is a
+        callable returning the font of a size, like Assets.font, so the font
+        module is only needed once the overlay is shown. The text is only
+        re-rendered every refresh frames.
+        """
+        if not (self.enabled and self.overlay_visible):
+            self.rect = None
+            return None
+        import pygame  # pylint: disable=import-outside-toplevel
+        if self._overlay is None or self.frames % refresh == 0:
+            rendered = [font(28).render(line, True, (255, 255, 0)) for line in self.lines()]
+            width = max((text.get_width() for text in rendered), default=0)
+            self._overlay = pygame.Surface((width + 16, 24 * len(rendered) + 16))
+            for i, text in enumerate(rendered):
+                self._overlay.blit(text, (8, 8 + 24 * i))
+        self.rect = screen.blit(self._overlay, (16, 16))
+        return self.rect
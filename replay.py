@@ -0,0 +1,63 @@
+"""This module replays recorded input logs, headless or on screen."""
+import argparse
+import time
+
+import pygame
+
+import main
+from levelformat import LevelLibrary
+from simulation import Simulation
+
+def replay(path: str, display: bool = False, speed: float = 1.0,
+           levels: str = None) -> Simulation:
+    """Replay an input log and return the finished simulation.
+
+    Headless replays run as fast as possible. On screen, frames are shown at
+    speed times the recorded frame rate. Runs recorded with GAME_LEVELS need
+    the same level library.
+    """
+    seed, frames = main.InputLog.read(path)
+    sim = Simulation(None, seed=seed, hp_timer=False,
+                     levels=LevelLibrary(levels) if levels else None)
+    screen = view = None
+    if display:
+        screen = main.init_game()
+        clock = pygame.time.Clock()
+
+    for delta_time, frame in frames:
+        scene_id = sim.scene_id
+        if sim.step(frame, delta_time) != 'running':
+            break
+        if display:
+            if view is None or sim.scene_id != scene_id:
+                view = (main.ArenaView if sim.boss else main.LevelView)(sim.layout)
+            render(screen, sim, view)
+            clock.tick(speed / delta_time if delta_time else 0)
+    return sim
+
+def render(screen: pygame.Surface, sim: Simulation, view: main.LevelView) -> None:
+    """Draw the current simulation frame like level() and boss() do."""
+    camera_x, camera_y = (0, 40) if sim.boss else main.update_camera(sim.player, sim.layout,
+                                                                     screen)
+    main.update_display(screen, main.draw(screen, view, sim.enemies, sim.player,
+                                          camera_x, camera_y, not sim.boss))
+
+def main_cli() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('log', help='input log of a run recorded with GAME_RECORD=<path>, '
+                        'named <path>-<seed>')
+    parser.add_argument('--display', action='store_true', help='show the replay on screen')
+    parser.add_argument('--speed', type=float, default=1.0, help='on-screen replay speed')
+    parser.add_argument('--levels', default=None, help='level library the run was recorded with')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sim = replay(args.log, args.display, args.speed, args.levels)
+    seconds = time.perf_counter() - start
+    print('Status: ' + sim.status + ', scene ' + str(sim.scene_id) + ', HP ' + str(sim.player.hp))
+    print('Frames: ' + str(sim.frames) + ' in ' + format(seconds, '.3f') + ' s (' +
+          format(sim.elapsed / seconds if seconds else 0, '.1f') + 'x real time)')
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,252 @@
+"""This module captures and restores the full state of a headless simulation."""
+import struct
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+import pygame
+
+import main
+from levelformat import decode_layout, encode_layout
+
+MAGIC = b'GSS1'
+VERSION = 2
+STATUSES = ['running', 'quit', 'dead', 'won']
+HEADER = struct.Struct('<4sHBBIdBdB')
+RANDOM = struct.Struct('<B?d')
+LAYOUT = struct.Struct('<HH')
+PLAYER = struct.Struct('<4i2i4i2dBib?')
+ENEMY = struct.Struct('<BI4i2i4i2d?i')
+GROUP = struct.Struct('<HII')
+AWAKE = struct.Struct('<Hd')
+STORE = struct.Struct('<I16s16sBI')
+NO_RECT = (0, 0, 0, 0)
+CONTAINERS = ['group', 'store', 'boss']
+
+class SimState(NamedTuple):
+    """Snapshot of a Simulation made of immutable values.
+
+    Snapshots share nothing mutable with the simulation, so any number of
+    them can be kept for rewinding and each can be restored many times to
+    branch off new runs. tiles is the TileGrid the snapshot was taken on. It
+    is reused on restore while its layout is unchanged, and rebuilt from
+    layout otherwise.
+    """
+    scene_id: int
+    status: str
+    frames: int
+    elapsed: float
+    attacked: bool
+    drain_timer: float
+    random: tuple
+    pending: Tuple[Tuple[int, int], ...]
+    layout: Tuple[str, ...]
+    tiles: Optional[main.TileGrid]
+    player: tuple
+    enemies: tuple
+
+def _rect(rect: Optional[pygame.Rect]) -> tuple:
+    return tuple(rect) if rect is not None else NO_RECT
+
+def _player(player: main.Player) -> tuple:
+    return (_rect(player.rect), tuple(player.previous), _rect(player.sword_rect),
+            tuple(player.vel), player.jump_counter, player.hp, player.direction, player.attacked)
+
+def _enemy(enemy, order: int = 0) -> tuple:
+    vel = getattr(enemy, 'vel', None)
+    return (main.LEVEL_ENEMIES.index(type(enemy)), order, _rect(enemy.rect),
+            tuple(enemy.previous), _rect(getattr(enemy, 'sword_rect', None)),
+            tuple(vel) if vel is not None else (0.0, 0.0),
+            getattr(enemy, 'enable', False), enemy.hp)
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array = array.copy()
+    array.flags.writeable = False
+    return array
+
+def _enemies(enemies) -> tuple:
+    if isinstance(enemies, main.Scarecrow):
+        return 'boss', _enemy(enemies)
+    if isinstance(enemies, main.EnemyStore):
+        return ('store', _frozen(enemies.kind), _frozen(enemies.pos), _frozen(enemies.vel),
+                _frozen(enemies.previous), _frozen(enemies.hp), _frozen(enemies.enable),
+                enemies.rng.bit_generator.state)
+    sprites = enemies.sprites()
+    index = {enemy: position for position, enemy in enumerate(sprites)}
+    return ('group', tuple(_enemy(enemy, enemies.order[enemy]) for enemy in sprites),
+            tuple((index[enemy], pending) for enemy, pending in enemies.awake.items()),
+            enemies.added, enemies.steps)
+
+def snapshot(sim) -> SimState:
+    """Capture the state of a Simulation, cheap enough to take every step."""
+    return SimState(sim.scene_id, sim.status, sim.frames, sim.elapsed, sim.attacked,
+                    sim._drain_timer, sim.rng.getstate(),  # pylint: disable=protected-access
+                    tuple(sorted(sim.loader._pending.items())),  # pylint: disable=protected-access
+                    tuple(map(''.join, sim.layout)), sim.tiles, _player(sim.player),
+                    _enemies(sim.enemies))
+
+def _load_player(state: tuple) -> main.Player:
+    rect, previous, sword_rect, vel, jump_counter, hp, direction, attacked = state
+    player = main.Player(0, 0)
+    player.rect = pygame.Rect(rect)
+    player.previous = previous
+    player.sword_rect = pygame.Rect(sword_rect)
+    player.vel = pygame.Vector2(vel)
+    player.jump_counter = jump_counter
+    player.hp = hp
+    player.direction = direction
+    player.attacked = attacked
+    return player
+
+def _load_enemy(state: tuple, rng):
+    kind, _, rect, previous, sword_rect, vel, enable, hp = state
+    enemy = main.LEVEL_ENEMIES[kind](0, 0, rng)
+    enemy.rect = pygame.Rect(rect)
+    enemy.previous = previous
+    if hasattr(enemy, 'sword_rect'):
+        enemy.sword_rect = pygame.Rect(sword_rect)
+    if hasattr(enemy, 'vel'):
+        enemy.vel = pygame.Vector2(vel)
+    if hasattr(enemy, 'enable'):
+        enemy.enable = enable
+    enemy.hp = hp
+    return enemy
+
+def _load_enemies(state: tuple, rng):
+    if state[0] == 'boss':
+        return _load_enemy(state[1], rng)
+    if state[0] == 'store':
+        _, kind, pos, vel, previous, hp, enable, rng = state
+        enemies = main.EnemyStore([], seed=0)
+        enemies.kind = kind.copy()
+        enemies.size = enemies.SIZES[enemies.kind]
+        enemies.pos, enemies.vel, enemies.previous = pos.copy(), vel.copy(), previous.copy()
+        enemies.hp, enemies.enable = hp.copy(), enable.copy()
+        enemies.rng.bit_generator.state = rng
+        return enemies
+    _, sprites, awake, added, steps = state
+    loaded = [_load_enemy(enemy, rng) for enemy in sprites]
+    enemies = main.EnemyGroup(loaded)
+    enemies.order = {enemy: sprite[1] for enemy, sprite in zip(loaded, sprites)}
+    enemies.awake = {loaded[index]: pending for index, pending in awake}
+    enemies.added = added
+    enemies.steps = steps
+    return enemies
+
+def restore(sim, state: SimState) -> None:
+    """Put a Simulation back into a captured state."""
+    sim.scene_id = state.scene_id
+    sim.status = state.status
+    sim.frames = state.frames
+    sim.elapsed = state.elapsed
+    sim.attacked = state.attacked
+    sim._drain_timer = state.drain_timer  # pylint: disable=protected-access
+    sim.rng.setstate(state.random)
+    sim.loader.clear()
+    sim.loader._pending.update(state.pending)  # pylint: disable=protected-access
+    tiles = state.tiles
+    if tiles is None or tuple(map(''.join, tiles.layout)) != state.layout:
+        tiles = main.TileGrid(list(map(list, state.layout)))
+    sim.layout, sim.tiles = tiles.layout, tiles
+    sim.player = _load_player(state.player)
+    sim.enemies = _load_enemies(state.enemies, sim.rng)
+
+def _pack_enemy(state: tuple) -> bytes:
+    kind, order, rect, previous, sword_rect, vel, enable, hp = state
+    return ENEMY.pack(kind, order, *rect, *previous, *sword_rect, *vel, enable, hp)
+
+def _unpack_enemy(blob: bytes, offset: int) -> tuple:
+    values = ENEMY.unpack_from(blob, offset)
+    return (values[0], values[1], values[2:6], values[6:8], values[8:12], values[12:14],
+            values[14], values[15])
+
+def pack(state: SimState) -> bytes:
+    """Serialize a snapshot into a compact binary blob.
+
+    The blob holds a HEADER, the simulation's random state, the pending level
+    seeds, the layout as levelformat tile codes, the player and the enemies.
+    """
+    version, internal, gauss = state.random
+    layout = encode_layout([list(row) for row in state.layout])
+    parts = [HEADER.pack(MAGIC, VERSION, state.scene_id, STATUSES.index(state.status),
+                         state.frames, state.elapsed, state.attacked, state.drain_timer,
+                         len(state.pending)),
+             RANDOM.pack(version, gauss is not None, gauss or 0.0),
+             np.array(internal, dtype='<u4').tobytes(),
+             np.array(state.pending, dtype='<u8').tobytes(),
+             LAYOUT.pack(*layout.shape), layout.tobytes(),
+             PLAYER.pack(*state.player[0], *state.player[1], *state.player[2],
+                         *state.player[3], *state.player[4:])]
+    container = state.enemies[0]
+    parts.append(bytes([CONTAINERS.index(container)]))
+    if container == 'boss':
+        parts.append(_pack_enemy(state.enemies[1]))
+    elif container == 'store':
+        _, kind, pos, vel, previous, hp, enable, rng = state.enemies
+        parts.append(STORE.pack(len(kind), rng['state']['state'].to_bytes(16, 'little'),
+                                rng['state']['inc'].to_bytes(16, 'little'),
+                                rng['has_uint32'], rng['uinteger']))
+        parts += [kind.astype('i1').tobytes(), pos.astype('<f8').tobytes(),
+                  vel.astype('<f8').tobytes(), previous.astype('<f8').tobytes(),
+                  hp.astype('<i8').tobytes(), enable.astype('?').tobytes()]
+    else:
+        _, sprites, awake, added, steps = state.enemies
+        parts.append(GROUP.pack(len(sprites), added, steps))
+        parts += [_pack_enemy(enemy) for enemy in sprites]
+        parts.append(struct.pack('<H', len(awake)))
+        parts += [AWAKE.pack(index, pending) for index, pending in awake]
+    return b''.join(parts)
+
+def unpack(blob: bytes) -> SimState:
+    """Read a snapshot serialized by pack."""
+    magic, version, scene_id, status, frames, elapsed, attacked, drain_timer, pending = \
+        HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a simulation save state')
+    offset = HEADER.size
+    random_version, has_gauss, gauss = RANDOM.unpack_from(blob, offset)
+    offset += RANDOM.size
+    internal = tuple(np.frombuffer(blob, '<u4', 625, offset).tolist())
+    offset += 4 * 625
+    seeds = np.frombuffer(blob, '<u8', 2 * pending, offset).reshape(-1, 2).tolist()
+    offset += 16 * pending
+    rows, cols = LAYOUT.unpack_from(blob, offset)
+    offset += LAYOUT.size
+    layout = decode_layout(np.frombuffer(blob, np.uint8, rows * cols, offset).reshape(rows, cols))
+    offset += rows * cols
+    player = PLAYER.unpack_from(blob, offset)
+    offset += PLAYER.size
+    player = (player[0:4], player[4:6], player[6:10], player[10:12]) + player[12:]
+
+    container = CONTAINERS[blob[offset]]
+    offset += 1
+    if container == 'boss':
+        enemies = ('boss', _unpack_enemy(blob, offset))
+    elif container == 'store':
+        count, state, inc, has_uint32, uinteger = STORE.unpack_from(blob, offset)
+        offset += STORE.size
+        arrays = []
+        for dtype, shape in [('i1', (count,)), ('<f8', (count, 2)), ('<f8', (count, 2)),
+                             ('<f8', (count, 2)), ('<i8', (count,)), ('?', (count,))]:
+            size = int(np.prod(shape))
+            arrays.append(_frozen(np.frombuffer(blob, dtype, size, offset).reshape(shape)))
+            offset += size * np.dtype(dtype).itemsize
+        rng = {'bit_generator': 'PCG64',
+               'state': {'state': int.from_bytes(state, 'little'),
+                         'inc': int.from_bytes(inc, 'little')},
+               'has_uint32': has_uint32, 'uinteger': uinteger}
+        enemies = ('store', *arrays, rng)
+    else:
+        count, added, steps = GROUP.unpack_from(blob, offset)
+        offset += GROUP.size
+        sprites = []
+        for _ in range(count):
+            sprites.append(_unpack_enemy(blob, offset))
+            offset += ENEMY.size
+        awake = []
+        for _ in range(struct.unpack_from('<H', blob, offset)[0]):
+            awake.append(AWAKE.unpack_from(blob, offset + 2 + len(awake) * AWAKE.size))
+        enemies = ('group', tuple(sprites), tuple(awake), added, steps)
+
+    return SimState(scene_id, STATUSES[status], frames, elapsed, bool(attacked), drain_timer,
+                    (random_version, internal, gauss if has_gauss else None),
+                    tuple(map(tuple, seeds)), tuple(map(''.join, layout)), None, player, enemies)
@@ -0,0 +1,168 @@
+"""This module runs the game logic headless at a fixed timestep."""
+import random
+from typing import List, Optional
+
+import main
+import savestate
+from main import FrameInput
+
+TIMESTEP = main.SIM_STEP_MS / 1000
+HP_DRAIN_INTERVAL = 1.0
+
+class ScriptedInput:
+    """Input source replaying a fixed list of frames, idle afterwards."""
+    def __init__(self, frames: List[FrameInput], loop: bool = False):
+        self.frames = frames
+        self.loop = loop
+        self.index = 0
+
+    def __call__(self, simulation) -> FrameInput:
+        if self.index >= len(self.frames):
+            if not self.loop or not self.frames:
+                return FrameInput()
+            self.index = 0
+        frame = self.frames[self.index]
+        self.index += 1
+        return frame
+
+class RandomInput:
+    """Seeded input source holding random moves for a few frames at a time."""
+    def __init__(self, seed: Optional[int] = None, hold: int = 15,
+                 jump_chance: float = 0.05, attack_chance: float = 0.1):
+        self.rng = random.Random(seed)
+        self.hold = hold
+        self.jump_chance = jump_chance
+        self.attack_chance = attack_chance
+        self.move = 0
+        self.frame = 0
+
+    def __call__(self, simulation) -> FrameInput:
+        if self.frame % self.hold == 0:
+            self.move = self.rng.choice([-1, 0, 1])
+        self.frame += 1
+        return FrameInput(self.move,
+                          int(self.rng.random() < self.jump_chance),
+                          int(self.rng.random() < self.attack_chance))
+
+class Simulation:
+    """Headless game session stepping levels and the boss fight at a fixed timestep.
+
+    The input source is called once per step with the simulation and returns a
+    FrameInput. HP drain ticks are generated from simulated time unless
+    hp_timer is False, in which case they are taken from the input. Levels are
+    planned through an unthreaded LevelLoader in the same order as main() does,
+    so a seeded simulation plays the same levels as a seeded interactive run.
+    levels is an optional LevelLibrary to pick levels from, like GAME_LEVELS.
+    enemies sets the roster size of generated levels and store spawns
+    Kamikazes and Slashers into an EnemyStore. Level seeds and enemy
+    chances come from rng, a random.Random of its own seeded with seed
+    unless given, so simulations never touch each other's state. Passing
+    the rng of a finished simulation continues its stream.
+    """
+    def __init__(self, inputs, scene_id: int = 1, seed: Optional[int] = None,
+                 timestep: float = TIMESTEP, hp_timer: bool = True, levels=None,
+                 enemies: Optional[int] = None, rng: Optional[random.Random] = None,
+                 store: bool = False):
+        self.inputs = inputs
+        self.timestep = timestep
+        self.hp_timer = hp_timer
+        self.seed = seed
+        self.status = 'running'
+        self.frames = 0
+        self.elapsed = 0.0
+        self.attacked = False
+        self.scene_id = scene_id
+        self.layout = None
+        self.tiles = None
+        self.player = None
+        self.enemies = None
+        self._drain_timer = 0.0
+        self.rng = rng or random.Random(seed)
+        self.store = store
+        self.loader = main.LevelLoader(threaded=False, library=levels, enemies=enemies,
+                                       rng=self.rng)
+        self.loader.prefetch(scene_id)
+        self.load_scene(scene_id)
+
+    def load_scene(self, scene_id: int) -> None:
+        """Build the map, player and enemies of a scene like level() and boss() do."""
+        self.scene_id = scene_id
+        self._drain_timer = 0.0
+        if scene_id == 4:
+            self.layout = main.BOSS_LAYOUT
+            self.tiles = main.TileGrid(self.layout)
+            self.player, self.enemies = main.create_boss(self.rng)
+        else:
+            plan = self.loader.take(scene_id)
+            self.loader.prefetch(scene_id + 1)
+            self.layout, self.tiles = plan.layout, plan.tiles
+            self.player = main.Player(*plan.spawn)
+            self.enemies = main.spawn_enemies(plan.enemies, self.rng, self.store)
+
+    @property
+    def boss(self) -> bool:
+        """Whether the current scene is the boss fight."""
+        return self.scene_id == 4
+
+    def step(self, frame: Optional[FrameInput] = None,
+             delta_time: Optional[float] = None) -> str:
+        """Advance the simulation by one frame and return its status.
+
+        The frame input and time default to the input source and the fixed
+        timestep. The status is 'running', 'quit', 'dead' or 'won'.
+        """
+        if self.status != 'running':
+            return self.status
+
+        delta_time = self.timestep if delta_time is None else delta_time
+        frame = self.inputs(self) if frame is None else frame
+        if self.hp_timer:
+            self._drain_timer += delta_time
+            drains = int(self._drain_timer // HP_DRAIN_INTERVAL)
+            self._drain_timer -= drains * HP_DRAIN_INTERVAL
+            frame = frame._replace(drains=drains)
+        if frame.attacks:
+            self.attacked = True
+
+        self.frames += 1
+        self.elapsed += delta_time
+        if not main.apply_input(frame, not self.boss, self.player, self.enemies):
+            self.status = 'quit'
+            return self.status
+        main.entity_update(delta_time, self.tiles, self.player, self.enemies)
+
+        if self.boss:
+            if self.enemies.hp <= 0:
+                self.status = 'won'
+            elif self.player.hp <= 0:
+                self.status = 'dead'
+            return self.status
+
+        self.enemies.reap()
+        if self.player.hp <= 0:
+            self.status = 'dead'
+        elif main.next_level(self.tiles, self.player):
+            self.load_scene(self.scene_id + 1)
+        return self.status
+
+    def snapshot(self) -> savestate.SimState:
+        """Capture the game state for restore(), the input source is not part of it."""
+        return savestate.snapshot(self)
+
+    def restore(self, state: savestate.SimState) -> None:
+        """Rewind or branch to a state captured by snapshot() or read by load()."""
+        savestate.restore(self, state)
+
+    def save(self) -> bytes:
+        """Game state as a compact binary blob."""
+        return savestate.pack(self.snapshot())
+
+    def load(self, blob: bytes) -> None:
+        """Restore a game state saved by save()."""
+        self.restore(savestate.unpack(blob))
+
+    def run(self, max_frames: Optional[int] = None) -> str:
+        """Step as fast as possible until the run ends or max_frames is reached."""
+        while self.status == 'running' and (max_frames is None or self.frames < max_frames):
+            self.step()
+        return self.status
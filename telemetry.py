@@ -0,0 +1,114 @@
+"""This module records structured telemetry events to rotating JSONL files."""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30}
+EVENTS = {'path': 'debug', 'frame': 'debug', 'damage': 'info', 'level': 'info'}
+
+class Telemetry:
+    """Buffered telemetry sink.
+
+    emit() appends a record to an in-memory queue. A background thread takes
+    the queued records in batches every interval seconds, or as soon as batch
+    records are waiting, and writes them as JSON lines. The file is rotated
+    to path.1 ... path.<backups> once it grows past max_bytes.
+
+    Events below the level and all but every n-th event of a type sampled
+    with n are dropped in emit(). While stopped, enabled is False and call
+    sites skip building their records altogether.
+    """
+    def __init__(self, batch: int = 512, interval: float = 1.0,
+                 max_bytes: int = 16 << 20, backups: int = 3):
+        self.batch = batch
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = False
+        self.path = None
+        self._level = LEVELS['info']
+        self._sample: Dict[str, int] = {}
+        self._counts: Dict[str, int] = {}
+        self._records = deque()
+        self._wake = threading.Event()
+        self._thread = None
+        self._file = None
+        self._start = time.perf_counter()
+        self._frame = None
+
+    def start(self, path: str, level: str = 'info',
+              sample: Optional[Dict[str, int]] = None) -> None:
+        """Start recording events of at least level to path, keeping every n-th of sample."""
+        self.stop()
+        self.path = path
+        self._level = LEVELS[level]
+        self._sample = dict(sample or {})
+        self._counts = {}
+        self._frame = None
+        self._file = open(path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+        self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self.enabled = True
+        self._thread.start()
+
+    def emit(self, event: str, **fields) -> None:
+        """Queue an event record."""
+        if not self.enabled or LEVELS[EVENTS[event]] < self._level:
+            return
+        every = self._sample.get(event)
+        if every:
+            count = self._counts.get(event, 0)
+            self._counts[event] = count + 1
+            if count % every:
+                return
+        self._records.append((time.perf_counter() - self._start, event, fields))
+        if len(self._records) >= self.batch:
+            self._wake.set()
+
+    def frame(self, **fields) -> None:
+        """Queue a frame event with the time since the previous one."""
+        now = time.perf_counter()
+        if self._frame is not None:
+            self.emit('frame', ms=round((now - self._frame) * 1000, 3), **fields)
+        self._frame = now
+
+    def _write(self) -> None:
+        lines = []
+        while self._records:
+            clock, event, fields = self._records.popleft()
+            lines.append(json.dumps({'t': round(clock, 6), 'event': event, **fields},
+                                    separators=(',', ':')))
+        if not lines:
+            return
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(self.path + '.' + str(index)):
+                os.replace(self.path + '.' + str(index), self.path + '.' + str(index + 1))
+        os.replace(self.path, self.path + '.1')
+        self._file = open(self.path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+
+    def _run(self) -> None:
+        while self.enabled:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._write()
+
+    def stop(self) -> None:
+        """Write the queued events and close the file."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._wake.set()
+        self._thread.join()
+        self._write()
+        self._file.close()
+        self._file = None
+        self._thread = None
@@ -0,0 +1,46 @@
+"""Tests of the frame profiler overlay."""
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame  # pylint: disable=wrong-import-position
+import pytest  # pylint: disable=wrong-import-position
+
+import main  # pylint: disable=wrong-import-position
+from profiler import FrameProfiler  # pylint: disable=wrong-import-position
+
+@pytest.fixture(name='screen')
+def fixture_screen(monkeypatch):
+    """Display opened by init_game, with a fresh profiler and no font module."""
+    monkeypatch.setattr(main, 'PROFILER', FrameProfiler())
+    monkeypatch.setattr(main, 'ASSETS', main.Assets())
+    pygame.font.quit()
+    yield main.init_game()
+    pygame.display.quit()
+
+def test_overlay_without_menu(screen):
+    """Showing the overlay before any other text was rendered initializes fonts."""
+    assert not pygame.font.get_init()
+    main.PROFILER.toggle_overlay()
+    for _ in range(31):
+        main.update_display(screen, [])
+    assert pygame.font.get_init()
+    assert main.PROFILER.draw(screen, main.ASSETS.font).width > 16
+
+def test_hidden_overlay_repainted(screen):
+    """Hiding the overlay repaints the arena background it covered."""
+    view = main.ArenaView(main.BOSS_LAYOUT)
+    player, boss = main.create_boss()
+    main.PROFILER.toggle_overlay()
+    for _ in range(31):
+        main.update_display(screen, main.draw(screen, view, boss, player, 0, 40, False))
+    rect = main.PROFILER.rect.clip(pygame.Rect(0, 0, boss.hp_bar.left, screen.get_height()))
+    main.PROFILER.toggle_overlay()
+    dirty = main.draw(screen, view, boss, player, 0, 40, False)
+    main.update_display(screen, dirty)
+    background = pygame.Surface(screen.get_size())
+    view.blit(background, 0, 40)
+    assert any(area.contains(rect) for area in dirty)
+    assert (pygame.surfarray.array3d(screen.subsurface(rect)) ==
+            pygame.surfarray.array3d(background.subsurface(rect))).all()
+    assert main.PROFILER.rect is None
@@ -0,0 +1,274 @@
+"""This module streams very large exploration maps in fixed-size chunks."""
+import argparse
+import random
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import pygame
+
+import main
+from main import MAP_SIZE, TILE_SIZE
+
+TILES = ' #'
+
+class ChunkStore:
+    """Memory-mapped file of chunk tile arrays, indexed by chunk position.
+
+    The file only lives for the session, it spares regenerating chunks that
+    were already visited and evicted.
+    """
+    def __init__(self, path: str, chunk_size: int, capacity: int = 64):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.slots = {}
+        self._map = np.memmap(path, np.uint8, 'w+', shape=(capacity, chunk_size, chunk_size))
+
+    def __contains__(self, key) -> bool:
+        return key in self.slots
+
+    def get(self, key) -> np.ndarray:
+        """Tile array of a stored chunk, backed by the file."""
+        return self._map[self.slots[key]]
+
+    def put(self, key, tiles: np.ndarray) -> None:
+        """Store a chunk, growing the file when it is full."""
+        if key in self.slots:
+            return
+        if len(self.slots) == len(self._map):
+            self._map.flush()
+            self._map = np.memmap(self.path, np.uint8, 'r+',
+                                  shape=(2 * len(self._map),) + tiles.shape)
+        self.slots[key] = len(self.slots)
+        self._map[self.slots[key]] = tiles
+
+    def close(self) -> None:
+        """Flush and unmap the file."""
+        self._map.flush()
+        self._map = None
+
+class WorldRow:
+    """Read-only row of a ChunkedWorld, indexed like a layout row."""
+    def __init__(self, world, row: int):
+        self.world = world
+        self.row = row
+
+    def __len__(self) -> int:
+        return self.world.cols
+
+    def __getitem__(self, col: int) -> str:
+        return self.world.tile(self.row, col)
+
+class WorldLayout:
+    """Read-only layout view of a ChunkedWorld for code indexing layout[row][col]."""
+    def __init__(self, world):
+        self.world = world
+
+    def __len__(self) -> int:
+        return self.world.rows
+
+    def __getitem__(self, row: int) -> WorldRow:
+        return WorldRow(self.world, row)
+
+class ChunkedWorld(main.TileGrid):
+    """Tile grid of width x height chunks, generated on demand from a seed.
+
+    Every chunk is a generate_floor() map whose border is opened by one door
+    per shared edge, placed from the seed of that edge so both sides agree.
+    The chunk is then repaired like generate_map() does, which connects the
+    doors to the rest of its floor, so the whole world stays connected.
+    Chunks are generated the same way every time, so they can be dropped from
+    memory: stream() keeps the chunks around the camera and evicts the least
+    recently used others once the tile arrays exceed budget bytes, writing
+    them to the optional ChunkStore at store.
+    """
+    # pylint: disable=super-init-not-called
+    def __init__(self, seed: Optional[int] = None, width: int = 64, height: int = 64,
+                 chunk_size: int = MAP_SIZE, budget: int = 1 << 18, store: str = None):
+        self.seed = random.getrandbits(63) if seed is None else seed
+        self.chunk_size = chunk_size
+        self.width = width
+        self.height = height
+        self.rows = height * chunk_size
+        self.cols = width * chunk_size
+        self.budget = budget
+        self.layout = WorldLayout(self)
+        self.exits = []
+        self.store = ChunkStore(store, chunk_size) if store else None
+        self.window = None
+        self.generated = 0
+        self._chunks = OrderedDict()
+        self._pinned = set()
+        self.pathfinder = RegionPathfinder(self)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the chunks in memory."""
+        return sum(tiles.nbytes for tiles in self._chunks.values())
+
+    def door(self, axis: int, chunk_x: int, chunk_y: int) -> int:
+        """Door offset on the right (axis 0) or bottom (axis 1) edge of a chunk."""
+        rng = np.random.default_rng([self.seed, axis, chunk_x, chunk_y])
+        return 1 + 2 * int(rng.integers((self.chunk_size - 1) // 2))
+
+    def _generate(self, chunk_x: int, chunk_y: int) -> np.ndarray:
+        size = self.chunk_size
+        rng = np.random.default_rng([self.seed, 0, chunk_x, chunk_y])
+        floor = main.generate_floor(size, rng)
+        if chunk_x + 1 < self.width:
+            floor[self.door(0, chunk_x, chunk_y), size - 2:] = True
+        if chunk_x > 0:
+            floor[self.door(0, chunk_x - 1, chunk_y), :2] = True
+        if chunk_y + 1 < self.height:
+            floor[size - 2:, self.door(1, chunk_x, chunk_y)] = True
+        if chunk_y > 0:
+            floor[:2, self.door(1, chunk_x, chunk_y - 1)] = True
+        if len(np.unique(main.floor_components(floor)[floor])) > 1:
+            main.repair_floor(floor, rng)
+        self.generated += 1
+        return (~floor).astype(np.uint8)
+
+    def chunk(self, chunk_x: int, chunk_y: int) -> np.ndarray:
+        """Tile array of a chunk, 0 for floor and 1 for walls, loaded on demand."""
+        key = (chunk_x, chunk_y)
+        tiles = self._chunks.get(key)
+        if tiles is not None:
+            self._chunks.move_to_end(key)
+            return tiles
+        if self.store and key in self.store:
+            tiles = self.store.get(key)
+        else:
+            tiles = self._generate(chunk_x, chunk_y)
+        self._chunks[key] = tiles
+        self._evict()
+        return tiles
+
+    def _evict(self) -> None:
+        size = self.chunk_size * self.chunk_size
+        for key in list(self._chunks):
+            if len(self._chunks) * size <= self.budget:
+                break
+            if key not in self._pinned:
+                tiles = self._chunks.pop(key)
+                if self.store:
+                    self.store.put(key, tiles)
+
+    def stream(self, viewport: pygame.Rect, margin: int = 1) -> None:
+        """Load the chunks within margin chunks of the world-space viewport."""
+        span = self.chunk_size * TILE_SIZE
+        window = (max(viewport.left // span - margin, 0), max(viewport.top // span - margin, 0),
+                  min((viewport.right - 1) // span + margin, self.width - 1),
+                  min((viewport.bottom - 1) // span + margin, self.height - 1))
+        if window == self.window:
+            return
+        self.window = window
+        left, top, right, bottom = window
+        self._pinned = {(x, y) for y in range(top, bottom + 1) for x in range(left, right + 1)}
+        for chunk_x, chunk_y in sorted(self._pinned):
+            self.chunk(chunk_x, chunk_y)
+        self._evict()
+
+    def tile(self, row: int, col: int) -> str:
+        """Return the tile at the grid position, walls outside the map."""
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            size = self.chunk_size
+            return TILES[self.chunk(col // size, row // size)[row % size, col % size]]
+        return '#'
+
+    def colliding(self, rect: pygame.Rect, kind: str = '#') -> List[pygame.Rect]:
+        """Return the rects of tiles of the given kind overlapping rect."""
+        tiles = []
+        for y in range(rect.top // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE + 1):
+            for x in range(rect.left // TILE_SIZE, (rect.right - 1) // TILE_SIZE + 1):
+                if self.tile(y, x) == kind:
+                    tiles.append(pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+        return tiles
+
+    def spawn(self):
+        """Player spawn position on the bottom floor row of the first chunk."""
+        row = self.chunk_size - 2
+        for col in range(1, self.chunk_size - 1):
+            if self.tile(row, col) == ' ':
+                return col * TILE_SIZE + TILE_SIZE // 2, (row + 1) * TILE_SIZE
+        return None
+
+    def close(self) -> None:
+        """Release the chunk store, if any."""
+        if self.store:
+            self.store.close()
+
+class RegionPathfinder:
+    """Pathfinder over the streamed window of a ChunkedWorld, in world tile coordinates."""
+    def __init__(self, world: ChunkedWorld):
+        self.world = world
+        self.window = None
+        self.origin = (0, 0)
+        self._inner = None
+
+    def _sync(self) -> Optional[main.Pathfinder]:
+        if self.world.window != self.window:
+            self.window = self.world.window
+            left, top, right, bottom = self.window
+            size = self.world.chunk_size
+            self.origin = (top * size, left * size)
+            layout = [[self.world.tile(row, col) for col in range(left * size, (right + 1) * size)]
+                      for row in range(top * size, (bottom + 1) * size)]
+            self._inner = main.TileGrid(layout).pathfinder
+        return self._inner
+
+    def _local(self, position):
+        return position[0] - self.origin[0], position[1] - self.origin[1]
+
+    def distance(self, start, target) -> int:
+        """Tile distance from start to target inside the window, -1 if unreachable."""
+        inner = self._sync()
+        return inner.distance(self._local(start), self._local(target)) if inner else -1
+
+    def next_step(self, start, target):
+        """Next tile on a shortest path inside the window, None if there is none."""
+        inner = self._sync()
+        step = inner.next_step(self._local(start), self._local(target)) if inner else None
+        if step is None:
+            return None
+        return step[0] + self.origin[0], step[1] + self.origin[1]
+
+def explore(screen: pygame.Surface, world: ChunkedWorld) -> None:
+    """Walk a chunked world until quit or escape, streaming chunks around the camera."""
+    clock = pygame.time.Clock()
+    steps = main.FixedStep()
+    view = main.LevelView(world.layout)
+    player = main.Player(*world.spawn())
+    enemies = main.EnemyGroup()
+
+    while True:
+        for _ in range(steps.advance(clock.tick(main.MAX_FPS))):
+            main.remember_positions(player, enemies)
+            if not main.handle_events(True, player, enemies, main.SIM_STEP_MS):
+                return
+            main.entity_update(main.SIM_STEP_MS / 1000, world, player, enemies)
+
+        camera_x, camera_y = main.update_camera(player, world.layout, screen, steps.alpha)
+        world.stream(screen.get_rect(topleft=(camera_x, camera_y)))
+        main.update_display(screen, main.draw(screen, view, enemies, player,
+                                              camera_x, camera_y, True, steps.alpha))
+
+def main_cli() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--width', type=int, default=64, help='world width in chunks')
+    parser.add_argument('--height', type=int, default=64, help='world height in chunks')
+    parser.add_argument('--budget', type=int, default=256, help='chunk memory budget in KiB')
+    parser.add_argument('--store', default=None, help='memory-mapped file for visited chunks')
+    args = parser.parse_args()
+
+    world = ChunkedWorld(args.seed, args.width, args.height, budget=args.budget * 1024,
+                         store=args.store)
+    try:
+        explore(main.init_game(), world)
+    finally:
+        world.close()
+        pygame.quit()
+
+if __name__ == '__main__':
+    main_cli()